@@ -0,0 +1,337 @@
+# Standard Library
+import datetime
+import random
+import uuid
+
+# Django
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+# First-Party
+from api.models import Appearance
+from api.models import Assignment
+from api.models import Award
+from api.models import Chart
+from api.models import Contest
+from api.models import Contestant
+from api.models import Convention
+from api.models import Entry
+from api.models import Group
+from api.models import Member
+from api.models import Person
+from api.models import Repertory
+from api.models import Round
+from api.models import Session
+from api.models import Venue
+
+
+class Command(BaseCommand):
+    help = "Command to generate synthetic conventions in bulk."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--districts',
+            type=int,
+            default=1,
+            help='Number of districts, each with one convention.',
+        )
+        parser.add_argument(
+            '--kinds',
+            nargs='+',
+            choices=['quartet', 'chorus'],
+            default=['quartet'],
+            help='One session of each kind per convention.',
+        )
+        parser.add_argument(
+            '--entries',
+            type=int,
+            default=50,
+            help='Approved entries per session.',
+        )
+        parser.add_argument(
+            '--rounds',
+            type=int,
+            choices=[1, 2, 3],
+            default=3,
+            help='Rounds per session.',
+        )
+        parser.add_argument(
+            '--panel',
+            type=int,
+            choices=[1, 2, 3, 4, 5],
+            default=5,
+            help='Judges per category.',
+        )
+        parser.add_argument(
+            '--chorus-size',
+            type=int,
+            default=30,
+            help='Members per chorus.',
+        )
+        parser.add_argument(
+            '--charts',
+            type=int,
+            default=500,
+            help='Size of the shared chart pool.',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=None,
+            help='Random seed, for reproducible data.',
+        )
+        parser.add_argument(
+            '--run',
+            action='store_true',
+            help='Drive every session through the round FSM to finished.',
+        )
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        self.token = uuid.uuid4().hex[:8]
+        person_max = Person.objects.aggregate(max=Max('bhs_id'))['max']
+        group_max = Group.objects.aggregate(max=Max('bhs_id'))['max']
+        self.person_ids = iter(range((person_max or 100000) + 1, 10 ** 9))
+        self.group_ids = iter(range((group_max or 100000) + 1, 10 ** 9))
+        with transaction.atomic():
+            sessions = self.generate(options)
+        self.stdout.write("Generated {0} sessions".format(len(sessions)))
+        if options['run']:
+            for session in sessions:
+                self.run(session)
+                self.stdout.write("Finished {0}".format(session))
+        return
+
+    def make_persons(self, count, label):
+        persons = [
+            Person(
+                first_name=label,
+                last_name=str(i),
+                bhs_id=next(self.person_ids),
+            ) for i in range(1, count + 1)
+        ]
+        Person.objects.bulk_create(persons)
+        return persons
+
+    def generate(self, options):
+        kinds = {
+            'quartet': (Session.KIND.quartet, Group.KIND.quartet),
+            'chorus': (Session.KIND.chorus, Group.KIND.chorus),
+        }
+        parts = [
+            Member.PART.tenor,
+            Member.PART.lead,
+            Member.PART.baritone,
+            Member.PART.bass,
+        ]
+        venue = Venue.objects.create(
+            name='Synthetic Convention Center',
+            status=Venue.STATUS.active,
+            city='Nashville',
+            state='TN',
+            airport='BNA',
+            timezone='US/Central',
+        )
+        charts = [
+            Chart(
+                title='Synthetic {0} {1}'.format(self.token, i),
+                arrangers='Arranger {0}'.format(i),
+                status=Chart.STATUS.active,
+            ) for i in range(1, options['charts'] + 1)
+        ]
+        Chart.objects.bulk_create(charts)
+        districts = [
+            Group(
+                name='District {0} {1}'.format(self.token, i),
+                kind=Group.KIND.district,
+                status=Group.STATUS.active,
+            ) for i in range(1, options['districts'] + 1)
+        ]
+        Group.objects.bulk_create(districts)
+        conventions = [
+            Convention(
+                name='{0} Convention'.format(district.name),
+                status=Convention.STATUS.active,
+                season=Convention.SEASON.fall,
+                panel=options['panel'],
+                year=datetime.date.today().year,
+                open_date=datetime.date.today(),
+                close_date=datetime.date.today() + datetime.timedelta(days=30),
+                start_date=datetime.date.today() + datetime.timedelta(days=60),
+                end_date=datetime.date.today() + datetime.timedelta(days=62),
+                venue=venue,
+                group=district,
+            ) for district in districts
+        ]
+        Convention.objects.bulk_create(conventions)
+
+        # Panels: a DRCJ, a CA and the judges of each convention
+        categories = [Assignment.CATEGORY.drcj, Assignment.CATEGORY.ca]
+        for category in [
+            Assignment.CATEGORY.music,
+            Assignment.CATEGORY.performance,
+            Assignment.CATEGORY.singing,
+        ]:
+            categories.extend([category] * options['panel'])
+        judges = iter(self.make_persons(
+            len(categories) * len(conventions),
+            'Judge',
+        ))
+        Assignment.objects.bulk_create([
+            Assignment(
+                convention=convention,
+                person=next(judges),
+                status=Assignment.STATUS.active,
+                kind=Assignment.KIND.official,
+                category=category,
+            ) for convention in conventions for category in categories
+        ])
+
+        sessions = []
+        awards = []
+        for convention in conventions:
+            for name in options['kinds']:
+                session_kind, group_kind = kinds[name]
+                sessions.append(Session(
+                    convention=convention,
+                    kind=session_kind,
+                    num_rounds=options['rounds'],
+                    status=Session.STATUS.verified,
+                ))
+                # A multi-round championship and a single-round qualifier
+                for rounds, level in [
+                    (options['rounds'], Award.LEVEL.championship),
+                    (1, Award.LEVEL.qualifier),
+                ]:
+                    awards.append(Award(
+                        name='{0} {1} {2}'.format(
+                            convention.group.name,
+                            name.title(),
+                            Award.LEVEL[level],
+                        ),
+                        status=Award.STATUS.active,
+                        kind=group_kind,
+                        level=level,
+                        season=Award.SEASON.fall,
+                        rounds=rounds,
+                        threshold=76.0 if level == Award.LEVEL.qualifier else None,
+                        group=convention.group,
+                    ))
+        Session.objects.bulk_create(sessions)
+        Award.objects.bulk_create(awards)
+        contests = [
+            Contest(
+                session=session,
+                award=award,
+                status=Contest.STATUS.included,
+            ) for session, pair in zip(sessions, zip(awards[::2], awards[1::2]))
+            for award in pair
+        ]
+        Contest.objects.bulk_create(contests)
+        # Fewer spots in each later round, down to the finals
+        rounds = []
+        for session in sessions:
+            for num in range(1, options['rounds'] + 1):
+                kind = options['rounds'] - num + 1
+                rounds.append(Round(
+                    session=session,
+                    num=num,
+                    kind=kind,
+                    status=Round.STATUS.new,
+                    spots=max(options['entries'] >> num, 1) if kind > 1 else None,
+                ))
+        Round.objects.bulk_create(rounds)
+
+        # Competing groups, their singers and repertories
+        groups = []
+        group_kinds = dict(kinds.values())
+        for session in sessions:
+            group_kind = group_kinds[session.kind]
+            for i in range(options['entries']):
+                groups.append(Group(
+                    name='{0} {1} {2}'.format(
+                        Group.KIND[group_kind],
+                        self.token,
+                        len(groups) + 1,
+                    ),
+                    kind=group_kind,
+                    status=Group.STATUS.active,
+                    bhs_id=next(self.group_ids),
+                    parent=session.convention.group,
+                ))
+        Group.objects.bulk_create(groups)
+        sizes = [
+            4 if group.kind == Group.KIND.quartet else options['chorus_size']
+            for group in groups
+        ]
+        singers = iter(self.make_persons(sum(sizes), 'Singer'))
+        members = []
+        for group, size in zip(groups, sizes):
+            for i in range(size):
+                members.append(Member(
+                    group=group,
+                    person=next(singers),
+                    status=Member.STATUS.active,
+                    part=parts[i % 4],
+                ))
+        Member.objects.bulk_create(members)
+        Repertory.objects.bulk_create([
+            Repertory(
+                group=group,
+                chart=chart,
+                status=Repertory.STATUS.active,
+            ) for group in groups
+            for chart in random.sample(charts, min(6, len(charts)))
+        ])
+
+        # Entries, drawn in order, entered in every contest of the session
+        groups = iter(groups)
+        entries = []
+        for session in sessions:
+            for draw in range(1, options['entries'] + 1):
+                entries.append(Entry(
+                    session=session,
+                    group=next(groups),
+                    status=Entry.STATUS.approved,
+                    is_evaluation=False,
+                    is_private=False,
+                    draw=draw,
+                    prelim=round(random.uniform(60, 90), 1),
+                ))
+        Entry.objects.bulk_create(entries)
+        session_contests = {}
+        for contest in contests:
+            session_contests.setdefault(contest.session_id, []).append(contest)
+        Contestant.objects.bulk_create([
+            Contestant(
+                entry=entry,
+                contest=contest,
+                status=Contestant.STATUS.included,
+            ) for entry in entries
+            for contest in session_contests[entry.session_id]
+        ])
+        return sessions
+
+    def run(self, session):
+        session.start()
+        session.save()
+        for round in session.rounds.order_by('num'):
+            round.build()
+            round.save()
+            round.start()
+            round.save()
+            round.mock()
+            # Clear any variances as the CA would after review
+            for appearance in round.appearances.filter(
+                status=Appearance.STATUS.variance,
+            ):
+                appearance.verify()
+                appearance.save()
+            round.verify()
+            round.save()
+            round.finish()
+            round.save()
+        session.finish()
+        session.save()
+        return
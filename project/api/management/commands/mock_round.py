@@ -10,7 +10,6 @@ from django.core.management.base import BaseCommand
 from django.utils import timezone
 
 # First-Party
-from api.models import Appearance
 from api.models import Round
 
 
@@ -27,11 +26,6 @@ class Command(BaseCommand):
         round = Round.objects.get(id=options['round_id'])
         if round.status < Round.STATUS.started:
             raise RuntimeError("Round not started")
-        appearances = round.appearances.exclude(
-            status=Appearance.STATUS.verified,
-        )
-        for appearance in appearances:
-            appearance.mock()
-            appearance.save()
+        round.mock()
         self.stdout.write("Mocked round")
         return
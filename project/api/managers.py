@@ -9,19 +9,17 @@ import maya
 import django_rq
 from algoliasearch_django.decorators import disable_auto_indexing
 from dictdiffer import diff
-from openpyxl import Workbook
-from openpyxl.writer.excel import save_virtual_workbook
 
 # Django
 from django.apps import apps
 from django.contrib.auth.models import BaseUserManager
 from django.core.exceptions import ValidationError
-from django.core.files.base import ContentFile
 from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import RegexValidator
 from django.core.validators import URLValidator
 from django.core.validators import validate_email
 from django.db import IntegrityError
+from django.db import transaction
 from django.db.models import CharField
 from django.db.models import F
 from django.db.models import Manager
@@ -34,6 +32,8 @@ from django.utils.timezone import now
 # First-Party
 from api.tasks import get_accounts
 from api.tasks import get_auth0
+from api.utils import XLSX_CHUNK_SIZE
+from api.utils import write_xlsx
 
 log = logging.getLogger(__name__)
 
@@ -70,20 +70,11 @@ class AwardManager(Manager):
         return
 
 class ChartManager(Manager):
-    def get_report(self):
-        wb = Workbook()
-        ws = wb.active
-        fieldnames = [
-            'PK',
-            'Title',
-            'Arrangers',
-            'Composers',
-            'Lyricists',
-            'Holders',
-            'Status',
-        ]
-        ws.append(fieldnames)
-        charts = self.order_by('title', 'arrangers')
+    def get_report_rows(self):
+        charts = self.order_by(
+            'title',
+            'arrangers',
+        ).iterator(chunk_size=XLSX_CHUNK_SIZE)
         for chart in charts:
             pk = str(chart.pk)
             title = chart.title
@@ -92,7 +83,7 @@ class ChartManager(Manager):
             lyricists = chart.lyricists
             holders = chart.holders
             status = chart.get_status_display()
-            row = [
+            yield [
                 pk,
                 title,
                 arrangers,
@@ -101,10 +92,18 @@ class ChartManager(Manager):
                 holders,
                 status,
             ]
-            ws.append(row)
-        file = save_virtual_workbook(wb)
-        content = ContentFile(file)
-        return content
+
+    def get_report(self):
+        fieldnames = [
+            'PK',
+            'Title',
+            'Arrangers',
+            'Composers',
+            'Lyricists',
+            'Holders',
+            'Status',
+        ]
+        return write_xlsx(fieldnames, self.get_report_rows())
 
 
 class GridManager(Manager):
@@ -406,27 +405,25 @@ class GroupManager(Manager):
                     quartet.save()
         return
 
-    def get_quartets(self):
-        wb = Workbook()
-        ws = wb.active
-        fieldnames = [
-            'PK',
-            'Name',
-            'Kind',
-            'Organization',
-            'District',
-            'Division',
-            'Chapter',
-            'Senior?',
-            'BHS ID',
-            'Code',
-            'Status',
-        ]
-        ws.append(fieldnames)
+    def get_quartet_rows(self):
         groups = self.filter(
             status=self.model.STATUS.active,
             kind=self.model.KIND.quartet,
-        ).order_by('name')
+        ).only(
+            'id',
+            'name',
+            'kind',
+            'international',
+            'district',
+            'division',
+            'chapter',
+            'is_senior',
+            'bhs_id',
+            'code',
+            'status',
+        ).order_by(
+            'name',
+        ).iterator(chunk_size=XLSX_CHUNK_SIZE)
         for group in groups:
             pk = str(group.pk)
             name = group.name
@@ -439,7 +436,7 @@ class GroupManager(Manager):
             bhs_id = group.bhs_id
             code = group.code
             status = group.get_status_display()
-            row = [
+            yield [
                 pk,
                 name,
                 kind,
@@ -452,10 +449,22 @@ class GroupManager(Manager):
                 code,
                 status,
             ]
-            ws.append(row)
-        file = save_virtual_workbook(wb)
-        content = ContentFile(file)
-        return content
+
+    def get_quartets(self):
+        fieldnames = [
+            'PK',
+            'Name',
+            'Kind',
+            'Organization',
+            'District',
+            'Division',
+            'Chapter',
+            'Senior?',
+            'BHS ID',
+            'Code',
+            'Status',
+        ]
+        return write_xlsx(fieldnames, self.get_quartet_rows())
 
 
 class MemberManager(Manager):
@@ -762,9 +771,10 @@ class PersonManager(Manager):
             created = False
         except self.model.DoesNotExist:
             try:
-                person = self.create(
-                    **defaults,
-                )
+                with transaction.atomic():
+                    person = self.create(
+                        **defaults,
+                    )
             except IntegrityError as e:
                 # Need to delete old offending record
                 if "api_person_bhs_id_key" in str(e.args):
@@ -779,9 +789,10 @@ class PersonManager(Manager):
                     defaults['mc_pk'] = mc_pk
                     defaults.pop('bhs_id', None)
                     try:
-                        person = self.create(
-                            **defaults,
-                        )
+                        with transaction.atomic():
+                            person = self.create(
+                                **defaults,
+                            )
                     except IntegrityError:
                         defaults['mc_pk'] = mc_pk
                         defaults['bhs_id'] = bhs_id
@@ -898,9 +909,10 @@ class UserManager(BaseUserManager):
             created = False
         except self.model.DoesNotExist:
             try:
-                user = self.create_user(
-                    **defaults,
-                )
+                with transaction.atomic():
+                    user = self.create_user(
+                        **defaults,
+                    )
             except IntegrityError as e:
                 # Need to delete old offending record
                 if "api_user_mc_pk_key" in str(e.args):
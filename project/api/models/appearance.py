@@ -1,8 +1,6 @@
 
 # Standard Library
 import uuid
-import pydf
-from random import randint
 
 # Third-Party
 import django_rq
@@ -22,14 +20,18 @@ from django.apps import apps
 from django.contrib.contenttypes.fields import GenericRelation
 from django.core.exceptions import ValidationError
 from django.db import models
-from django.db.models import Avg
-from django.db.models import Q
-from django.db.models import Sum
 from django.utils.functional import cached_property
 from django.utils.timezone import now
 from django.template.loader import render_to_string
 from django.utils.text import slugify
 
+# First-Party
+from api.utils import bulk_update
+from api.utils import calculate_totals
+from api.utils import detect_variances
+from api.utils import generate_pdf
+from api.utils import score_aggregates
+
 
 class Appearance(TimeStampedModel):
     """
@@ -249,114 +251,39 @@ class Appearance(TimeStampedModel):
             'variances': variances,
         }
         rendered = render_to_string('variance.html', context)
-        pdf = pydf.generate_pdf(rendered, enable_smart_shrinking=False)
+        pdf = generate_pdf(rendered, enable_smart_shrinking=False)
         content = ContentFile(pdf)
         return content
 
 
     def mock(self):
         # Mock Appearance
-        Chart = apps.get_model('api.chart')
-        prelim = self.competitor.entry.prelim
-        if self.competitor.group.kind == self.competitor.group.KIND.chorus:
-            pos = self.competitor.group.members.filter(
-                status=self.competitor.group.members.model.STATUS.active,
-            ).count()
-            self.pos = pos
-        if not prelim:
-            average = self.competitor.group.competitors.filter(
-                status=self.competitor.group.competitors.model.STATUS.finished,
-            ).aggregate(avg=Avg('tot_score'))['avg']
-            if average:
-                prelim = average
-            else:
-                prelim = randint(65, 80)
-        songs = self.songs.all()
-        for song in songs:
-            song.chart = Chart.objects.filter(
-                status=Chart.STATUS.active
-            ).order_by("?").first()
-            song.save()
-            scores = song.scores.all()
-            for score in scores:
-                d = randint(-4, 4)
-                score.points = prelim + d
-                score.save()
-        if self.status == self.STATUS.new:
-            raise RuntimeError("Out of state")
-        if self.status == self.STATUS.built:
-            self.start()
-            self.finish()
-            self.verify()
-            return
-        if self.status == self.STATUS.started:
-            self.finish()
-            self.verify()
-            return
-        if self.status == self.STATUS.finished:
-            self.verify()
-            return
-
+        self.round.mock([self])
+        return
 
     def calculate(self):
+        totals = self.songs.aggregate(**score_aggregates('scores__'))
+        for key, value in totals.items():
+            setattr(self, key, value)
+
+    def check_variance(self, variances=None):
+        # `variances` may be passed in from a round-wide pass
         Score = apps.get_model('api.score')
-        tot = Sum('points')
-        mus = Sum('points', filter=Q(category=Score.CATEGORY.music))
-        per = Sum('points', filter=Q(category=Score.CATEGORY.performance))
-        sng = Sum('points', filter=Q(category=Score.CATEGORY.singing))
-        officials = Score.objects.filter(
-            song__appearance=self,
-            kind=Score.KIND.official,
-        ).annotate(
-            tot=tot,
-            mus=mus,
-            per=per,
-            sng=sng,
-        )
-        tot = officials.aggregate(
-            sum=Sum('points'),
-            avg=Avg('points'),
-        )
-        mus = officials.filter(
-            category=Score.CATEGORY.music,
-        ).aggregate(
-            sum=Sum('points'),
-            avg=Avg('points'),
-        )
-        per = officials.filter(
-            category=Score.CATEGORY.performance,
-        ).aggregate(
-            sum=Sum('points'),
-            avg=Avg('points'),
-        )
-        sng = officials.filter(
-            category=Score.CATEGORY.singing,
-        ).aggregate(
-            sum=Sum('points'),
-            avg=Avg('points'),
-        )
-        self.tot_points = tot['sum']
-        self.tot_score = tot['avg']
-        self.mus_points = mus['sum']
-        self.mus_score = mus['avg']
-        self.per_points = per['sum']
-        self.per_score = per['avg']
-        self.sng_points = sng['sum']
-        self.sng_score = sng['avg']
-
-    def check_variance(self):
-        variance = False
-        for song in self.songs.all():
-            song.calculate()
-            asterisks = song.get_asterisks()
-            if asterisks:
-                song.asterisks = asterisks
-                variance = True
-            dixons = song.get_dixons()
-            if dixons:
-                song.dixons = dixons
-                variance = True
-            song.save()
+        songs = calculate_totals(self.songs.all(), 'scores__')
+        if variances is None:
+            scores = Score.objects.filter(
+                song__appearance=self,
+                kind=Score.KIND.official,
+            ).values_list(
+                'song',
+                'category',
+                'points',
+            )
+            variances = detect_variances(scores)
+        for song in songs:
+            song.asterisks, song.dixons = variances.get(song.id, ([], []))
+        bulk_update(songs, ['asterisks', 'dixons'])
+        variance = any(song.asterisks or song.dixons for song in songs)
         return variance
 
 
@@ -418,29 +345,9 @@ class Appearance(TimeStampedModel):
     @fsm_log_by
     @transition(field=status, source=[STATUS.new], target=STATUS.built)
     def build(self, *args, **kwargs):
-        Grid = apps.get_model('api.grid')
-        Panelist = apps.get_model('api.panelist')
-        grid, created = Grid.objects.get_or_create(
-            round=self.round,
-            num=self.num,
-        )
-        grid.appearance = self
-        grid.save()
-        panelists = self.round.panelists.filter(
-            category__gt=Panelist.CATEGORY.ca,
-        )
-        i = 1
-        while i <= 2:  # Number songs constant
-            song = self.songs.create(
-                num=i
-            )
-            for panelist in panelists:
-                song.scores.create(
-                    category=panelist.category,
-                    kind=panelist.kind,
-                    panelist=panelist,
-                )
-            i += 1
+        # Round.start scaffolds all of its appearances in bulk beforehand
+        if kwargs.get('scaffold', True):
+            self.round.scaffold([self])
         return
 
     @fsm_log_by
@@ -463,7 +370,7 @@ class Appearance(TimeStampedModel):
     )
     def verify(self, *args, **kwargs):
         if self.status == self.STATUS.finished:
-            variance = self.check_variance()
+            variance = self.check_variance(kwargs.get('variances'))
             if variance:
                 content = self.get_variance()
                 self.variance_report.save(
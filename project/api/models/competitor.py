@@ -4,7 +4,6 @@ import logging
 import uuid
 
 # Third-Party
-import pydf
 import django_rq
 from django_fsm import FSMIntegerField
 from django_fsm import transition
@@ -20,15 +19,14 @@ from django.apps import apps
 from django.contrib.contenttypes.fields import GenericRelation
 from django.core.files.base import ContentFile
 from django.db import models
-from django.db.models import Avg
-from django.db.models import Q
-from django.db.models import Sum
 from django.template.loader import render_to_string
 from django.core.mail import EmailMessage
 from django.utils.text import slugify
 
 # First-Party
 from api.fields import UploadPath
+from api.utils import generate_pdf
+from api.utils import score_aggregates
 
 log = logging.getLogger(__name__)
 
@@ -262,52 +260,13 @@ class Competitor(TimeStampedModel):
 
     # Competitor Methods
     def calculate(self):
-        Score = apps.get_model('api.score')
-        tot = Sum('points')
-        mus = Sum('points', filter=Q(category=Score.CATEGORY.music))
-        per = Sum('points', filter=Q(category=Score.CATEGORY.performance))
-        sng = Sum('points', filter=Q(category=Score.CATEGORY.singing))
-        officials = Score.objects.filter(
-            song__appearance__competitor=self,
-            kind=Score.KIND.official,
-        ).annotate(
-            tot=tot,
-            mus=mus,
-            per=per,
-            sng=sng,
+        totals = self.appearances.aggregate(
+            **score_aggregates('songs__scores__')
         )
-        tot = officials.aggregate(
-            sum=Sum('points'),
-            avg=Avg('points'),
-        )
-        mus = officials.filter(
-            category=Score.CATEGORY.music,
-        ).aggregate(
-            sum=Sum('points'),
-            avg=Avg('points'),
-        )
-        per = officials.filter(
-            category=Score.CATEGORY.performance,
-        ).aggregate(
-            sum=Sum('points'),
-            avg=Avg('points'),
-        )
-        sng = officials.filter(
-            category=Score.CATEGORY.singing,
-        ).aggregate(
-            sum=Sum('points'),
-            avg=Avg('points'),
-        )
-        self.tot_points = tot['sum']
-        self.tot_score = tot['avg']
-        self.mus_points = mus['sum']
-        self.mus_score = mus['avg']
-        self.per_points = per['sum']
-        self.per_score = per['avg']
-        self.sng_points = sng['sum']
-        self.sng_score = sng['avg']
+        for key, value in totals.items():
+            setattr(self, key, value)
 
-    def get_csa(self):
+    def get_csa_html(self):
         Panelist = apps.get_model('api.panelist')
         Member = apps.get_model('api.member')
         Song = apps.get_model('api.song')
@@ -343,7 +302,11 @@ class Competitor(TimeStampedModel):
             'songs': songs,
         }
         rendered = render_to_string('csa.html', context)
-        file = pydf.generate_pdf(rendered)
+        return rendered
+
+    def get_csa(self):
+        rendered = self.get_csa_html()
+        file = generate_pdf(rendered)
         content = ContentFile(file)
         return content
 
@@ -19,6 +19,9 @@ from django.contrib.contenttypes.fields import GenericRelation
 from django.core.exceptions import ValidationError
 from django.db import models
 
+# First-Party
+from api.utils import determine_contests
+
 config = api_apps.get_app_config('api')
 
 log = logging.getLogger(__name__)
@@ -139,32 +142,11 @@ class Contest(TimeStampedModel):
 
     # Methods
     def determine(self, *args, **kwargs):
-        if self.award.level in [
-            self.award.LEVEL.qualifier,
-            self.award.LEVEL.top,
-            self.award.LEVEL.manual,
-            self.award.LEVEL.deferred,
-        ]:
-            return
-        contestants = self.contestants.filter(
-            status__gt=0,
-        ).order_by(
-            '-entry__competitor__tot_points',
-            '-entry__competitor__sng_points',
-            '-entry__competitor__per_points',
+        contests = determine_contests(
+            self.__class__.objects.filter(pk=self.pk),
         )
-        if contestants:
-            multis = self.session.competitors.filter(
-                appearances__draw__gt=0,
-                is_multi=True,
-            )
-            if multis:
-                group = contestants.first().entry.group
-            else:
-                group = None
-        else:
-            group = None
-        self.group = group
+        for contest in contests:
+            self.group_id = contest.group_id
         return
 
     # Transitions
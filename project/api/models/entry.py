@@ -15,11 +15,15 @@ from model_utils import Choices
 from model_utils.models import TimeStampedModel
 
 # Django
+from django.apps import apps
 from django.contrib.contenttypes.fields import GenericRelation
 from django.core.exceptions import ValidationError
 from django.db import models
+from django.db import transaction
+from django.db.models import F
 from django.template.loader import render_to_string
 from django.core.mail import EmailMessage
+from django.utils.timezone import now
 
 log = logging.getLogger(__name__)
 
@@ -419,13 +423,25 @@ class Entry(TimeStampedModel):
         conditions=[],
     )
     def withdraw(self, *args, **kwargs):
-        if self.draw:
-            remains = self.session.entries.filter(draw__gt=self.draw)
+        Session = apps.get_model('api.session')
+        with transaction.atomic():
+            # Lock the session so concurrent withdrawals renumber in turn;
+            # the draw is re-read under the lock as it may have been
+            # assigned since this entry was loaded.
+            Session.objects.select_for_update().get(pk=self.session_id)
+            draw = self.__class__.objects.values_list(
+                'draw',
+                flat=True,
+            ).get(pk=self.pk)
+            if draw:
+                self.session.entries.filter(
+                    draw__gt=draw,
+                ).update(
+                    draw=F('draw') - 1,
+                    modified=now(),
+                )
             self.draw = None
             self.save()
-            for entry in remains:
-                entry.draw = entry.draw - 1
-                entry.save()
         contestants = self.contestants.filter(status__gte=0)
         for contestant in contestants:
             contestant.exclude()
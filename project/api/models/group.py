@@ -23,14 +23,13 @@ from django.core.validators import RegexValidator
 from django.db import models
 from django.urls import reverse
 from django.utils.functional import cached_property
-from openpyxl import Workbook
-from django.core.files.base import ContentFile
-from openpyxl.writer.excel import save_virtual_workbook
 
 # First-Party
 from api.fields import LowerEmailField
 from api.fields import UploadPath
 from api.managers import GroupManager
+from api.utils import XLSX_CHUNK_SIZE
+from api.utils import write_xlsx
 
 log = logging.getLogger(__name__)
 
@@ -386,38 +385,40 @@ class Group(TimeStampedModel):
         return bool(self.mc_pk)
 
     # Methods
-    def get_roster(self):
+    def get_roster_rows(self):
         Member = apps.get_model('api.member')
-        wb = Workbook()
-        ws = wb.active
-        fieldnames = [
-            'BHS ID',
-            'First Name',
-            'Last Name',
-            'Expiration Date',
-            'Status',
-        ]
-        ws.append(fieldnames)
         members = self.members.filter(
             status=Member.STATUS.active,
-        ).order_by('person__last_name', 'person__first_name')
+        ).select_related(
+            'person',
+            'person__user',
+        ).order_by(
+            'person__last_name',
+            'person__first_name',
+        ).iterator(chunk_size=XLSX_CHUNK_SIZE)
         for member in members:
             bhs_id = member.person.bhs_id
             first_name = member.person.first_name
             last_name = member.person.last_name
             expiration = member.person.user.current_through
             status = member.person.get_status_display()
-            row = [
+            yield [
                 bhs_id,
                 first_name,
                 last_name,
                 expiration,
                 status,
             ]
-            ws.append(row)
-        file = save_virtual_workbook(wb)
-        content = ContentFile(file)
-        return content
+
+    def get_roster(self):
+        fieldnames = [
+            'BHS ID',
+            'First Name',
+            'Last Name',
+            'Expiration Date',
+            'Status',
+        ]
+        return write_xlsx(fieldnames, self.get_roster_rows())
 
 
     def is_active(self):
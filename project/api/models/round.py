@@ -3,10 +3,11 @@
 import logging
 import random
 import uuid
-from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+from tempfile import NamedTemporaryFile
 
 # Third-Party
-import pydf
 from django_fsm import FSMIntegerField
 from django_fsm import transition
 from django_fsm_log.decorators import fsm_log_by
@@ -16,21 +17,60 @@ from dry_rest_permissions.generics import authenticated_users
 from model_utils import Choices
 from model_utils.models import TimeStampedModel
 from PyPDF2 import PdfFileMerger
-from ranking import ORDINAL
-from ranking import Ranking
 
 # Django
 from django.apps import apps
 from django.contrib.contenttypes.fields import GenericRelation
+from django.core.files import File
 from django.core.files.base import ContentFile
+from django.db import connection
 from django.db import models
+from django.db import transaction
+from django.db.models import Avg
+from django.db.models import Count
+from django.db.models import Q
+from django.db.models import Sum
 from django.template.loader import render_to_string
 from django.urls import reverse
 from django.utils.functional import cached_property
 from django.utils.text import slugify
 
+# First-Party
+from api.utils import assign_draws
+from api.utils import assign_ranks
+from api.utils import build_scoring_summary
+from api.utils import bulk_update
+from api.utils import calculate_totals
+from api.utils import detect_variances
+from api.utils import generate_pdf
+from api.utils import get_panel_counts
+from api.utils import get_report_fingerprint
+from api.utils import get_repertoire_history
+from api.utils import get_song_stats
+from api.utils import resolve_contest_details
+
 log = logging.getLogger(__name__)
 
+CSA_WORKERS = 4
+
+
+def spool_pdf(content):
+    """Copy the chunks of a PDF into a temporary file and rewind it."""
+    output = NamedTemporaryFile(suffix='.pdf')
+    for chunk in content:
+        output.write(chunk)
+    output.seek(0)
+    return output
+
+
+def render_csa(competitor):
+    """Render a competitor's CSA on a worker thread."""
+    try:
+        return spool_pdf(competitor.get_csa().chunks())
+    finally:
+        # Each worker thread opened its own connection
+        connection.close()
+
 
 class Round(TimeStampedModel):
     id = models.UUIDField(
@@ -139,87 +179,228 @@ class Round(TimeStampedModel):
         )
 
     # Methods
+    def calculate(self):
+        Song = apps.get_model('api.song')
+        Competitor = apps.get_model('api.competitor')
+        songs = Song.objects.filter(
+            appearance__round=self,
+        )
+        calculate_totals(songs, 'scores__')
+        appearances = self.appearances.all()
+        calculate_totals(appearances, 'songs__scores__')
+        # Competitor totals span all of their rounds
+        competitors = Competitor.objects.filter(
+            id__in=self.appearances.values('competitor'),
+        )
+        calculate_totals(competitors, 'appearances__songs__scores__')
+        return
+
+    def get_variances(self):
+        Score = apps.get_model('api.score')
+        scores = Score.objects.filter(
+            song__appearance__round=self,
+            kind=Score.KIND.official,
+        ).values_list(
+            'song',
+            'category',
+            'points',
+        )
+        return detect_variances(scores)
+
     def rank(self):
+        Song = apps.get_model('api.song')
         appearances = self.appearances.filter(
             competitor__is_private=False,
             competitor__status__gt=0,
-        ).distinct().order_by('-tot_points')
-        points = [x.tot_points for x in appearances]
-        ranked = Ranking(points, strategy=ORDINAL, start=1)
-        for appearance in appearances:
-            appearance.tot_rank = ranked.rank(appearance.tot_points)
-            appearance.save()
-        appearances = self.appearances.filter(
-            competitor__is_private=False,
-            competitor__status__gt=0,
-        ).distinct().order_by('-mus_points')
-        points = [x.mus_points for x in appearances]
-        ranked = Ranking(points, start=1)
-        for appearance in appearances:
-            appearance.mus_rank = ranked.rank(appearance.mus_points)
-            appearance.save()
-        appearances = self.appearances.filter(
-            competitor__is_private=False,
-            competitor__status__gt=0,
-        ).distinct().order_by('-per_points')
-        points = [x.per_points for x in appearances]
-        ranked = Ranking(points, start=1)
-        for appearance in appearances:
-            appearance.per_rank = ranked.rank(appearance.per_points)
-            appearance.save()
-        appearances = self.appearances.filter(
-            competitor__is_private=False,
-            competitor__status__gt=0,
-        ).distinct().order_by('-sng_points')
-        points = [x.sng_points for x in appearances]
-        ranked = Ranking(points, start=1)
-        for appearance in appearances:
-            appearance.sng_rank = ranked.rank(appearance.sng_points)
-            appearance.save()
+        ).distinct()
+        appearances = list(appearances)
+        fields = assign_ranks(appearances)
+        bulk_update(appearances, fields)
         # Songs ranked relative to Round
-        Song = apps.get_model('api.song')
-        songs = Song.objects.filter(
-            appearance__round=self,
-            appearance__competitor__is_private=False,
-            appearance__competitor__status__gt=0,
-        ).distinct().order_by('-tot_points')
-        points = [x.tot_points for x in songs]
-        ranked = Ranking(points, strategy=ORDINAL, start=1)
-        for song in songs:
-            song.tot_rank = ranked.rank(song.tot_points)
-            song.save()
         songs = Song.objects.filter(
             appearance__round=self,
             appearance__competitor__is_private=False,
             appearance__competitor__status__gt=0,
-        ).distinct().order_by('-mus_points')
-        points = [x.mus_points for x in songs]
-        ranked = Ranking(points, start=1)
-        for song in songs:
-            song.mus_rank = ranked.rank(song.mus_points)
-            song.save()
-        songs = Song.objects.filter(
-            appearance__round=self,
-            appearance__competitor__is_private=False,
-            appearance__competitor__status__gt=0,
-        ).distinct().order_by('-per_points')
-        points = [x.per_points for x in songs]
-        ranked = Ranking(points, start=1)
-        for song in songs:
-            song.per_rank = ranked.rank(song.per_points)
-            song.save()
-        songs = Song.objects.filter(
-            appearance__round=self,
-            appearance__competitor__is_private=False,
-            appearance__competitor__status__gt=0,
-        ).distinct().order_by('-sng_points')
-        points = [x.sng_points for x in songs]
-        ranked = Ranking(points, start=1)
+        ).distinct()
+        songs = list(songs)
+        fields = assign_ranks(songs)
+        bulk_update(songs, fields)
+        return
+
+    def update_grids(self, appearances):
+        Grid = apps.get_model('api.grid')
+        # Attach to existing grid slots; create the rest
+        grids = {
+            grid.num: grid for grid in Grid.objects.filter(
+                round=self,
+                num__in=[appearance.num for appearance in appearances],
+            )
+        }
+        new_grids = []
+        for appearance in appearances:
+            grid = grids.get(appearance.num)
+            if grid:
+                grid.appearance = appearance
+            else:
+                new_grids.append(
+                    Grid(
+                        round=self,
+                        num=appearance.num,
+                        appearance=appearance,
+                    )
+                )
+        bulk_update(grids.values(), ['appearance'])
+        Grid.objects.bulk_create(new_grids)
+        return
+
+    def scaffold(self, appearances):
+        Panelist = apps.get_model('api.panelist')
+        Song = apps.get_model('api.song')
+        Score = apps.get_model('api.score')
+        self.update_grids(appearances)
+        panelists = list(self.panelists.filter(
+            category__gt=Panelist.CATEGORY.ca,
+        ))
+        songs = [
+            Song(
+                appearance=appearance,
+                num=num,
+            )
+            for appearance in appearances
+            for num in range(1, 3)  # Number songs constant
+        ]
+        Song.objects.bulk_create(songs)
+        scores = [
+            Score(
+                song=song,
+                category=panelist.category,
+                kind=panelist.kind,
+                panelist=panelist,
+            )
+            for song in songs
+            for panelist in panelists
+        ]
+        Score.objects.bulk_create(scores)
+        return
+
+    def mock(self, appearances=None):
+        """Score and verify the unverified appearances with synthetic data.
+
+        Charts and points are written in bulk; only the transitions run
+        per appearance.
+        """
+        Appearance = apps.get_model('api.appearance')
+        Chart = apps.get_model('api.chart')
+        Competitor = apps.get_model('api.competitor')
+        Member = apps.get_model('api.member')
+        Score = apps.get_model('api.score')
+        Song = apps.get_model('api.song')
+        if appearances is None:
+            appearances = self.appearances.exclude(
+                status=Appearance.STATUS.verified,
+            ).select_related(
+                'competitor__entry',
+                'competitor__group',
+            )
+        appearances = list(appearances)
+        if any(a.status == Appearance.STATUS.new for a in appearances):
+            raise RuntimeError("Out of state")
+        groups = [appearance.competitor.group_id for appearance in appearances]
+        averages = dict(Competitor.objects.filter(
+            group__in=groups,
+            status=Competitor.STATUS.finished,
+        ).order_by(
+        ).values_list(
+            'group',
+        ).annotate(
+            avg=Avg('tot_score'),
+        ))
+        sizes = dict(Member.objects.filter(
+            group__in=groups,
+            status=Member.STATUS.active,
+        ).order_by(
+        ).values_list(
+            'group',
+        ).annotate(
+            count=Count('id'),
+        ))
+        charts = list(Chart.objects.filter(
+            status=Chart.STATUS.active,
+        ).values_list(
+            'id',
+            flat=True,
+        ))
+        prelims = {}
+        for appearance in appearances:
+            competitor = appearance.competitor
+            if competitor.group.kind == competitor.group.KIND.chorus:
+                appearance.pos = sizes.get(competitor.group_id, 0)
+            prelim = competitor.entry.prelim or averages.get(competitor.group_id)
+            prelims[appearance.id] = int(prelim or random.randint(65, 80))
+        songs = list(Song.objects.filter(
+            appearance__in=appearances,
+        ))
         for song in songs:
-            song.sng_rank = ranked.rank(song.sng_points)
-            song.save()
+            song.chart_id = random.choice(charts) if charts else None
+        bulk_update(songs, ['chart'])
+        scores = list(Score.objects.filter(
+            song__appearance__in=appearances,
+        ).select_related(
+            'song',
+        ))
+        for score in scores:
+            score.points = prelims[score.song.appearance_id] + random.randint(-4, 4)
+        bulk_update(scores, ['points'])
+        # Check the whole round for variances at once
+        variances = self.get_variances()
+        for appearance in appearances:
+            if appearance.status == Appearance.STATUS.built:
+                appearance.start()
+            if appearance.status == Appearance.STATUS.started:
+                appearance.finish()
+            if appearance.status == Appearance.STATUS.finished:
+                appearance.verify(variances=variances)
+            appearance.save()
         return
 
+    def get_fingerprint(self, template):
+        Award = apps.get_model('api.award')
+        Chart = apps.get_model('api.chart')
+        Contestant = apps.get_model('api.contestant')
+        Convention = apps.get_model('api.convention')
+        Entry = apps.get_model('api.entry')
+        Group = apps.get_model('api.group')
+        Person = apps.get_model('api.person')
+        Session = apps.get_model('api.session')
+        Song = apps.get_model('api.song')
+        Score = apps.get_model('api.score')
+        Venue = apps.get_model('api.venue')
+        competitors = self.session.competitors.all()
+        contests = self.session.contests.all()
+        songs = Song.objects.filter(appearance__round=self)
+        querysets = [
+            competitors,
+            contests,
+            self.appearances.all(),
+            self.panelists.all(),
+            songs,
+            Score.objects.filter(song__appearance__round=self),
+            # Rendered through the rows above
+            Session.objects.filter(pk=self.session_id),
+            Convention.objects.filter(sessions=self.session_id),
+            Venue.objects.filter(conventions__sessions=self.session_id),
+            Contestant.objects.filter(contest__session=self.session),
+            Award.objects.filter(id__in=contests.values('award')),
+            Entry.objects.filter(id__in=competitors.values('entry')),
+            Group.objects.filter(
+                Q(id__in=competitors.values('group')) |
+                Q(id__in=competitors.values('group__parent'))
+            ),
+            Chart.objects.filter(id__in=songs.values('chart')),
+            Person.objects.filter(id__in=self.panelists.values('person')),
+        ]
+        return get_report_fingerprint(template, self, querysets)
+
     def get_oss(self):
         Competitor = apps.get_model('api.competitor')
         Contest = apps.get_model('api.contest')
@@ -229,25 +410,13 @@ class Round(TimeStampedModel):
             appearances__round=self,
             appearances__draw__gt=0,
             is_private=False,
-        ).select_related(
-            'group',
-            'entry',
-        ).prefetch_related(
-            'entry__contestants',
-            'entry__contestants__contest',
-            'appearances',
-            'appearances__round',
-            'appearances__songs',
-            'appearances__songs__chart',
-            'appearances__songs__scores',
-            'appearances__songs__scores__panelist',
-            'appearances__songs__scores__panelist__person',
         ).order_by(
             '-tot_points',
             '-sng_points',
             '-per_points',
             'group__name',
         )
+        competitors = build_scoring_summary(competitors)
         # Eval Only
         privates = self.session.competitors.filter(
             appearances__round=self,
@@ -278,39 +447,7 @@ class Round(TimeStampedModel):
         ).order_by(
             'num',
         )
-        # MonkeyPatch qualifiers
-        for contest in contests:
-            if self.num >= contest.award.rounds:
-                if contest.award.level != contest.award.LEVEL.deferred:
-                    if contest.award.level == contest.award.LEVEL.qualifier:
-                        threshold = contest.award.threshold
-                        if threshold:
-                            qualifiers = contest.contestants.filter(
-                                status__gt=0,
-                                entry__competitor__tot_score__gte=threshold,
-                                entry__is_private=False,
-                            ).distinct(
-                            ).order_by(
-                                'entry__group__name',
-                            ).values_list(
-                                'entry__group__name',
-                                flat=True,
-                            )
-                            if qualifiers:
-                                contest.detail = ", ".join(
-                                    qualifiers.values_list('entry__group__name', flat=True)
-                                )
-                            else:
-                                contest.detail = "(No qualifiers)"
-                    else:
-                        if contest.group:
-                            contest.detail = str(contest.group.name)
-                        else:
-                            contest.detail = "(Result announced following Finals)"
-                else:
-                    contest.detail = "(Result determined post-contest)"
-            else:
-                contest.detail = "(Result not yet determined)"
+        contests = resolve_contest_details(contests, round=self)
         panelists = self.panelists.select_related(
             'person',
         ).filter(
@@ -334,7 +471,7 @@ class Round(TimeStampedModel):
             'is_multi': is_multi,
         }
         rendered = render_to_string('oss.html', context)
-        file = pydf.generate_pdf(
+        file = generate_pdf(
             rendered,
             page_size='Legal',
             orientation='Portrait',
@@ -344,6 +481,13 @@ class Round(TimeStampedModel):
         content = ContentFile(file)
         return content
 
+    def get_stats(self):
+        Song = apps.get_model('api.song')
+        songs = Song.objects.filter(
+            appearance__round=self,
+        )
+        return get_song_stats(songs)
+
     def get_sa(self):
         Panelist = apps.get_model('api.panelist')
         panelists = self.panelists.filter(
@@ -362,41 +506,12 @@ class Round(TimeStampedModel):
             'person__nick_name',
             'person__first_name',
         )
-        mo_count = panelists.filter(
-            category=Panelist.CATEGORY.music,
-            kind=Panelist.KIND.official,
-        ).count()
-        po_count = panelists.filter(
-            category=Panelist.CATEGORY.performance,
-            kind=Panelist.KIND.official,
-        ).count()
-        so_count = panelists.filter(
-            category=Panelist.CATEGORY.singing,
-            kind=Panelist.KIND.official,
-        ).count()
-        mp_count = panelists.filter(
-            category=Panelist.CATEGORY.music,
-            kind=Panelist.KIND.practice,
-        ).count()
-        pp_count = panelists.filter(
-            category=Panelist.CATEGORY.performance,
-            kind=Panelist.KIND.practice,
-        ).count()
-        sp_count = panelists.filter(
-            category=Panelist.CATEGORY.singing,
-            kind=Panelist.KIND.practice,
-        ).count()
+        panel = [person for person, _ in groupby(
+            panelist.person for panelist in panelists
+        )]
         competitors = self.session.competitors.filter(
             appearances__round=self,
             appearances__draw__gt=0,
-        ).select_related(
-            'group',
-        ).prefetch_related(
-            'appearances',
-            'appearances__songs',
-            'appearances__songs__scores',
-            'appearances__songs__scores__panelist',
-            'appearances__songs__scores__panelist__person',
         ).order_by(
             '-tot_points',
             '-sng_points',
@@ -404,19 +519,16 @@ class Round(TimeStampedModel):
             '-per_points',
             'group__name',
         )
+        competitors = build_scoring_summary(competitors, panel)
         context = {
             'round': self,
             'panelists': panelists,
+            'panel': panel,
             'competitors': competitors,
-            'mo_count': mo_count,
-            'po_count': po_count,
-            'so_count': so_count,
-            'mp_count': mp_count,
-            'pp_count': pp_count,
-            'sp_count': sp_count,
         }
+        context.update(get_panel_counts(panelists))
         rendered = render_to_string('sa.html', context)
-        file = pydf.generate_pdf(
+        file = generate_pdf(
             rendered,
             page_size='Letter',
             orientation='Landscape',
@@ -425,59 +537,113 @@ class Round(TimeStampedModel):
         return content
 
     def get_csa(self):
-        competitors = self.session.competitors.filter(
+        competitors = list(self.session.competitors.filter(
             appearances__round=self,
             appearances__draw__gt=0,
         ).order_by(
             'group__name',
-        )
+        ))
+        missing = [
+            competitor for competitor in competitors if not competitor.csa
+        ]
         merger = PdfFileMerger()
-        for competitor in competitors:
-            try:
-                file = ContentFile(competitor.csa.read())
-            except ValueError:
-                file = competitor.get_csa()
-            merger.append(file, import_bookmarks=False)
-        stream = BytesIO()
-        merger.write(stream)
-        data = stream.getvalue()
-        content = ContentFile(data)
+        with ThreadPoolExecutor(max_workers=CSA_WORKERS) as executor:
+            # Render the missing CSAs on worker threads, which each run
+            # their queries and wkhtmltopdf concurrently.  Their connections
+            # can't see an open transaction, so stay on this one inside it.
+            if connection.in_atomic_block:
+                generated = (
+                    spool_pdf(competitor.get_csa().chunks())
+                    for competitor in missing
+                )
+            else:
+                generated = executor.map(render_csa, missing)
+            # Merge in order as the renders come back; every CSA is spooled
+            # to disk and only read back when the bundle is written.
+            for competitor in competitors:
+                if competitor.csa:
+                    file = spool_pdf(competitor.csa.chunks())
+                else:
+                    file = next(generated)
+                merger.append(file, import_bookmarks=False)
+        output = NamedTemporaryFile(suffix='.pdf')
+        merger.write(output)
+        merger.close()
+        output.seek(0)
+        return File(output)
+
+    def get_announcements(self):
+        Competitor = apps.get_model('api.competitor')
+        appearances = self.appearances.filter(
+            draw__gt=0,
+        ).select_related(
+            'competitor__group',
+        ).order_by(
+            'draw',
+        )
+        mt = self.appearances.filter(
+            draw=0,
+        ).select_related(
+            'competitor__group',
+        ).order_by(
+            'competitor__group__name',
+        )
+        contests = self.session.contests.filter(
+            num__isnull=False,
+            group__isnull=False,
+        ).order_by('num')
+        if self.kind == self.KIND.finals:
+            competitors = self.session.competitors.filter(
+                status__in=[
+                    Competitor.STATUS.finished,
+                    Competitor.STATUS.started,
+                ],
+                tot_rank__lte=5,
+            ).select_related(
+                'group',
+            ).order_by(
+                '-tot_rank',
+            )
+        else:
+            competitors = None
+        pos = self.appearances.aggregate(sum=Sum('pos'))['sum']
+        context = {
+            'round': self,
+            'appearances': appearances,
+            'mt': mt,
+            'contests': contests,
+            'competitors': competitors,
+            'pos': pos,
+        }
+        rendered = render_to_string('announcements.html', context)
+        file = generate_pdf(rendered)
+        content = ContentFile(file)
         return content
 
     def get_sung(self):
-        Song = apps.get_model('api.song')
+        history = get_repertoire_history(self)
         appearances = self.appearances.filter(
             draw__gt=0,
+        ).select_related(
+            'competitor__group',
         ).order_by(
             'draw',
         )
         for appearance in appearances:
-            songs = Song.objects.filter(
-                appearance__competitor=appearance.competitor,
-            ).distinct().order_by(
-                'appearance__round__num',
-                'num',
-            )
-            sungs = []
-            for song in songs:
-                try:
-                    title = song.chart.nomen
-                except AttributeError:
-                    title = "Unknown (Not in Repertory)"
-                row = "{0} Song {1}: {2}".format(
-                    song.appearance.round.get_kind_display(),
-                    song.num,
-                    title,
-                )
-                sungs.append(row)
-            appearance.sungs = sungs
+            appearance.sungs = [
+                "{0} Song {1}: {2}".format(
+                    song['round'],
+                    song['num'],
+                    song['title'] or "Unknown (Not in Repertory)",
+                ) for song in history.get(appearance.competitor_id, [])
+            ]
 
         context = {
             'appearances': appearances,
             'round': self,
         }
         rendered = render_to_string('sung.html', context)
-        file = pydf.generate_pdf(
+        file = generate_pdf(
             rendered,
             page_size='Letter',
             orientation='Portrait',
@@ -603,39 +769,46 @@ class Round(TimeStampedModel):
             'person__nick_name',
             'person__first_name',
         )
-        for assignment in assignments:
-            self.panelists.create(
+        Panelist = apps.get_model('api.panelist')
+        panelists = [
+            Panelist(
+                round=self,
                 kind=assignment.kind,
                 category=assignment.category,
-                person=assignment.person,
-            )
+                person_id=assignment.person_id,
+            ) for assignment in assignments
+        ]
+        Panelist.objects.bulk_create(panelists)
         # Create the appearances
-        Competitor = apps.get_model('api.competitor')
-        Grid = apps.get_model('api.grid')
+        Appearance = apps.get_model('api.appearance')
         competitors = self.session.competitors.filter(
             status__gt=0,
+        ).select_related(
+            'entry',
         )
-        for competitor in competitors:
-            if self.num == 1:
-                num = competitor.entry.draw
-            else:
-                prior_round = self.session.rounds.get(num=self.num - 1)
-                prior_appearance = prior_round.appearances.get(
-                    competitor=competitor,
-                )
-                num = prior_appearance.draw
-            appearance = self.appearances.create(
-                competitor=competitor,
-                num=num,
-            )
-            defaults = {
-                'appearance': appearance,
+        if self.num == 1:
+            draws = {
+                competitor.id: competitor.entry.draw for competitor in competitors
             }
-            grid, created = Grid.objects.update_or_create(
+        else:
+            # Order of appearance is the draw from the prior round
+            draws = dict(Appearance.objects.filter(
+                round__session=self.session,
+                round__num=self.num - 1,
+                competitor__in=competitors,
+            ).values_list(
+                'competitor',
+                'draw',
+            ))
+        appearances = [
+            Appearance(
                 round=self,
-                num=num,
-                defaults=defaults,
-            )
+                competitor=competitor,
+                num=draws[competitor.id],
+            ) for competitor in competitors
+        ]
+        Appearance.objects.bulk_create(appearances)
+        self.update_grids(appearances)
         # MT
         # mt = self.session.competitors.filter(
         #     status=Competitor.STATUS.finished,
@@ -665,11 +838,8 @@ class Round(TimeStampedModel):
             'person__nick_name',
             'person__first_name',
         )
-        i = 0
-        for official in officials:
-            i += 1
+        for i, official in enumerate(officials, start=1):
             official.num = i
-            official.save()
         practices = self.panelists.filter(
             kind=Panelist.KIND.practice,
             category__gt=Panelist.CATEGORY.ca,
@@ -679,16 +849,15 @@ class Round(TimeStampedModel):
             'person__nick_name',
             'person__first_name',
         )
-        i = 50
-        for practice in practices:
-            i += 1
+        for i, practice in enumerate(practices, start=51):
             practice.num = i
-            practice.save()
-        # Build the appearances
-        appearances = self.appearances.all()
+        bulk_update(list(officials) + list(practices), ['num'])
+        # Build the appearances; score sheets for all of them at once
+        appearances = list(self.appearances.all())
+        self.scaffold(appearances)
         for appearance in appearances:
-            appearance.build()
-            appearance.save()
+            appearance.build(scaffold=False)
+        bulk_update(appearances, ['status'])
         return
 
     @fsm_log_by
@@ -696,7 +865,8 @@ class Round(TimeStampedModel):
     def verify(self, *args, **kwargs):
         Competitor = apps.get_model('api.competitor')
         Contestant = apps.get_model('api.contestant')
-        # Run rankings.
+        # Refresh totals and run rankings.
+        self.calculate()
         self.rank()
         self.session.rank()
 
@@ -707,9 +877,7 @@ class Round(TimeStampedModel):
                 num__isnull=False,
                 group__isnull=True,
             )
-            for contest in contests:
-                contest.determine()
-                contest.save()
+            self.session.determine(contests)
             return
 
         # If not finals, only determine winners when no contestants
@@ -720,9 +888,7 @@ class Round(TimeStampedModel):
             contestants__status=Contestant.STATUS.included,
             contestants__entry__competitor__is_multi=False,
         ).distinct()
-        for contest in contests:
-            contest.determine()
-            contest.save()
+        self.session.determine(contests)
 
         # Get spots available
         spots = self.spots
@@ -754,17 +920,15 @@ class Round(TimeStampedModel):
         else:
             advancers = [a.id for a in multis]
 
-        # Reset draw
-        self.appearances.update(draw=None)
-        # Get advancers and draw
-        appearances = self.appearances.filter(
-            competitor__id__in=advancers,
-        ).order_by('?')
-        i = 1
-        for appearance in appearances:
-            appearance.draw = i
-            appearance.save()
-            i += 1
+        with transaction.atomic():
+            # Reset draw
+            self.appearances.update(draw=None)
+            # Get advancers and draw
+            assign_draws(
+                self.appearances.filter(
+                    competitor__id__in=advancers,
+                )
+            )
         # create MT
         # mt = self.appearances.filter(
         #     draw=None,
@@ -3,10 +3,11 @@
 import datetime
 import logging
 import uuid
+from collections import defaultdict
+from itertools import groupby
 
 # Third-Party
 import django_rq
-import pydf
 from django_fsm import FSMIntegerField
 from django_fsm import transition
 from django_fsm_log.decorators import fsm_log_by
@@ -15,11 +16,6 @@ from dry_rest_permissions.generics import allow_staff_or_superuser
 from dry_rest_permissions.generics import authenticated_users
 from model_utils import Choices
 from model_utils.models import TimeStampedModel
-from openpyxl.writer.excel import save_virtual_workbook
-from ranking import ORDINAL
-from ranking import Ranking
-from openpyxl import Workbook
-from openpyxl.writer.excel import save_virtual_workbook
 
 # Django
 from django.apps import apps
@@ -29,8 +25,25 @@ from django.core.exceptions import ValidationError
 from django.core.files.base import ContentFile
 from django.core.mail import EmailMessage
 from django.db import models
+from django.db import transaction
+from django.db.models import Count
+from django.db.models import Prefetch
+from django.db.models import Q
 from django.template.loader import render_to_string
 
+# First-Party
+from api.utils import assign_draws
+from api.utils import assign_ranks
+from api.utils import build_scoring_summary
+from api.utils import bulk_update
+from api.utils import determine_contests
+from api.utils import generate_pdf
+from api.utils import get_panel_counts
+from api.utils import get_report_fingerprint
+from api.utils import iterate_prefetched
+from api.utils import resolve_contest_details
+from api.utils import write_xlsx
+
 log = logging.getLogger(__name__)
 
 
@@ -145,59 +158,44 @@ class Session(TimeStampedModel):
         competitors = self.competitors.filter(
             is_private=False,
             status__gt=0,
-        ).distinct().order_by('-tot_points')
-        points = [x.tot_points for x in competitors]
-        ranked = Ranking(points, strategy=ORDINAL, start=1)
-        for competitor in competitors:
-            competitor.tot_rank = ranked.rank(competitor.tot_points)
-            competitor.save()
-        competitors = self.competitors.filter(
-            is_private=False,
-            status__gt=0,
-        ).distinct().order_by('-mus_points')
-        points = [x.mus_points for x in competitors]
-        ranked = Ranking(points, start=1)
-        for competitor in competitors:
-            competitor.mus_rank = ranked.rank(competitor.mus_points)
-            competitor.save()
-        competitors = self.competitors.filter(
-            is_private=False,
-            status__gt=0,
-        ).distinct().order_by('-per_points')
-        points = [x.per_points for x in competitors]
-        ranked = Ranking(points, start=1)
-        for competitor in competitors:
-            competitor.per_rank = ranked.rank(competitor.per_points)
-            competitor.save()
-        competitors = self.competitors.filter(
-            is_private=False,
-            status__gt=0,
-        ).distinct().order_by('-sng_points')
-        points = [x.sng_points for x in competitors]
-        ranked = Ranking(points, start=1)
-        for competitor in competitors:
-            competitor.sng_rank = ranked.rank(competitor.sng_points)
-            competitor.save()
+        ).distinct()
+        competitors = list(competitors)
+        fields = assign_ranks(competitors)
+        bulk_update(competitors, fields)
         return
 
-    def get_legacy(self):
+    def determine(self, contests=None):
+        if contests is None:
+            contests = self.contests.filter(
+                num__isnull=False,
+            )
+        contests = determine_contests(contests)
+        bulk_update(contests, ['group'])
+        return contests
+
+    def get_legacy_rows(self):
         Entry = apps.get_model('api.entry')
-        wb = Workbook()
-        ws = wb.active
-        fieldnames = [
-            'oa',
-            'contestant_id',
-            'group_name',
-            'group_type',
-            'song_number',
-            'song_title',
-        ]
-        ws.append(fieldnames)
+        Repertory = apps.get_model('api.repertory')
         entries = self.entries.filter(
             status__in=[
                 Entry.STATUS.approved,
             ]
-        ).order_by('draw')
+        ).select_related(
+            'group',
+        ).order_by(
+            'draw',
+        )
+        entries = iterate_prefetched(
+            entries,
+            Prefetch(
+                'group__repertories',
+                queryset=Repertory.objects.select_related(
+                    'chart',
+                ).order_by(
+                    'chart__title',
+                ),
+            ),
+        )
         for entry in entries:
             oa = entry.draw
             group_name = entry.group.name.encode('utf-8').strip()
@@ -209,11 +207,11 @@ class Session(TimeStampedModel):
             else:
                 raise RuntimeError("Improper Entity Type")
             i = 1
-            for repertory in entry.group.repertories.order_by('chart__title'):
+            for repertory in entry.group.repertories.all():
                 song_number = i
                 song_title = repertory.chart.title.encode('utf-8').strip()
                 i += 1
-                row = [
+                yield [
                     oa,
                     contestant_id,
                     group_name,
@@ -221,18 +219,130 @@ class Session(TimeStampedModel):
                     song_number,
                     song_title,
                 ]
-                ws.append(row)
-        file = save_virtual_workbook(wb)
-        content = ContentFile(file)
-        return content
 
+    def get_legacy(self):
+        fieldnames = [
+            'oa',
+            'contestant_id',
+            'group_name',
+            'group_type',
+            'song_number',
+            'song_title',
+        ]
+        return write_xlsx(fieldnames, self.get_legacy_rows())
 
-    def get_drcj(self):
+
+    def get_drcj_rows(self):
         Entry = apps.get_model('api.entry')
         Group = apps.get_model('api.group')
         Member = apps.get_model('api.member')
-        wb = Workbook()
-        ws = wb.active
+        Contestant = apps.get_model('api.contestant')
+        entries = list(self.entries.filter(
+            status__in=[
+                Entry.STATUS.approved,
+            ]
+        ).select_related(
+            'group',
+            'group__parent',
+        ).annotate(
+            repertory_count=Count(
+                'group__repertories',
+                filter=Q(group__repertories__status__gt=0),
+            ),
+        ).order_by('draw'))
+        members = defaultdict(list)
+        for member in Member.objects.filter(
+            group__in=[entry.group_id for entry in entries],
+            status__gt=0,
+        ).select_related(
+            'person',
+            'person__user',
+        ):
+            members[member.group_id].append(member)
+        awards = defaultdict(list)
+        for entry, name in Contestant.objects.filter(
+            entry__in=entries,
+            status__gt=0,
+        ).order_by(
+            'contest__award__name',
+        ).values_list(
+            'entry',
+            'contest__award__name',
+        ):
+            awards[entry].append(name)
+        # The chapters of a quartet are those of the choruses its
+        # active members also sing in.
+        chapters = defaultdict(set)
+        for group, name in Member.objects.filter(
+            person__members__group__in=[
+                entry.group_id for entry in entries
+                if entry.group.kind == Group.KIND.quartet
+            ],
+            person__members__status__gt=0,
+            group__kind=Group.KIND.chorus,
+            status__gt=0,
+        ).values_list(
+            'person__members__group',
+            'group__parent__name',
+        ):
+            if name:
+                chapters[group].add(name)
+        close_date = self.convention.close_date
+        for entry in entries:
+            group = entry.group
+            expiring_count = 0
+            parts = defaultdict(list)
+            for member in members[group.id]:
+                user = getattr(member.person, 'user', None)
+                if all([
+                    user,
+                    getattr(user, 'current_through', None),
+                    close_date,
+                ]) and user.current_through <= close_date:
+                    expiring_count += 1
+                parts[member.part].append(member)
+            details = {}
+            for part in range(1, 5):
+                # Leave the part blank unless exactly one member sings it
+                if len(parts[part]) != 1:
+                    details[part] = None
+                    continue
+                person = parts[part][0].person
+                details[part] = "\n".join(filter(None, [
+                    person.nomen,
+                    person.email,
+                    person.phone,
+                ]))
+            if group.kind == Group.KIND.quartet:
+                chapter = "\n".join(sorted(chapters[group.id]))
+            elif group.kind == Group.KIND.chorus:
+                try:
+                    chapter = group.parent.name
+                except AttributeError:
+                    chapter = None
+            else:
+                chapter = None
+            yield [
+                entry.draw,
+                group.name,
+                entry.representing,
+                entry.is_evaluation,
+                entry.is_private,
+                group.bhs_id,
+                group.get_status_display(),
+                entry.repertory_count,
+                entry.pos,
+                expiring_count,
+                details[1],
+                details[2],
+                details[3],
+                details[4],
+                entry.participants,
+                "\n".join(filter(None, awards[entry.id])),
+                chapter,
+            ]
+
+    def get_drcj(self):
         fieldnames = [
             'OA',
             'Group Name',
@@ -252,148 +362,92 @@ class Session(TimeStampedModel):
             'Award(s)',
             'Chapter(s)',
         ]
-        ws.append(fieldnames)
-        entries = self.entries.filter(
-            status__in=[
-                Entry.STATUS.approved,
-            ]
-        ).order_by('draw')
-        for entry in entries:
-            oa = entry.draw
-            group_name = entry.group.name
-            representing = entry.representing
-            evaluation = entry.is_evaluation
-            private = entry.is_private
-            bhs_id = entry.group.bhs_id
-            repertory_count = entry.group.repertories.filter(
-                status__gt=0,
-            ).count()
-            group_status = entry.group.get_status_display()
-            repertory_count = entry.group.repertories.filter(
-                status__gt=0,
-            ).count()
-            participant_count = entry.pos
-            members = entry.group.members.filter(
-                status__gt=0,
-            )
-            expiring_count = members.filter(
-                person__user__current_through__lte=self.convention.close_date,
-            ).count()
-            participants = entry.participants
-            awards_list = []
-            contestants = entry.contestants.filter(
-                status__gt=0,
-            ).order_by('contest__award__name')
-            for contestant in contestants:
-                awards_list.append(contestant.contest.award.name)
-            awards = "\n".join(filter(None, awards_list))
-            parts = {}
-            part = 1
-            while part <= 4:
-                try:
-                    member = members.get(
-                        part=part,
-                    )
-                except Member.DoesNotExist:
-                    parts[part] = None
-                    part += 1
-                    continue
-                except Member.MultipleObjectsReturned:
-                    parts[part] = None
-                    part += 1
-                    continue
-                member_list = []
-                member_list.append(
-                    member.person.nomen,
-                )
-                member_list.append(
-                    member.person.email,
-                )
-                member_list.append(
-                    member.person.phone,
-                )
-                member_detail = "\n".join(filter(None, member_list))
-                parts[part] = member_detail
-                part += 1
-            if entry.group.kind == entry.group.KIND.quartet:
-                persons = members.values_list('person', flat=True)
-                cs = Group.objects.filter(
-                    members__person__in=persons,
-                    members__status__gt=0,
-                    kind=Group.KIND.chorus,
-                ).distinct(
-                ).order_by(
-                    'parent__name',
-                ).values_list(
-                    'parent__name',
-                    flat=True
-                )
-                chapters = "\n".join(cs)
-            elif entry.group.kind == entry.group.KIND.chorus:
-                try:
-                    chapters = entry.group.parent.name
-                except AttributeError:
-                    chapters = None
-            row = [
-                oa,
-                group_name,
-                representing,
-                evaluation,
-                private,
-                bhs_id,
-                group_status,
-                repertory_count,
-                participant_count,
-                expiring_count,
-                parts[1],
-                parts[2],
-                parts[3],
-                parts[4],
-                participants,
-                awards,
-                chapters,
-            ]
-            ws.append(row)
-        file = save_virtual_workbook(wb)
-        content = ContentFile(file)
-        return content
+        return write_xlsx(fieldnames, self.get_drcj_rows())
 
-    def get_contact(self):
+    def get_contact_rows(self):
         Entry = apps.get_model('api.entry')
-        wb = Workbook()
-        ws = wb.active
-        fieldnames = [
-            'group',
-            'admin',
-            'email',
-            'cell',
-        ]
-        ws.append(fieldnames)
+        Officer = apps.get_model('api.officer')
         entries = self.entries.filter(
             status__in=[
                 Entry.STATUS.approved,
             ]
-        ).order_by('group__name')
+        ).select_related(
+            'group',
+        ).order_by(
+            'group__name',
+        )
+        entries = iterate_prefetched(
+            entries,
+            Prefetch(
+                'group__officers',
+                queryset=Officer.objects.filter(
+                    status__gt=0,
+                ).select_related(
+                    'person',
+                ),
+            ),
+        )
         for entry in entries:
-            admins = entry.group.officers.filter(
-                status__gt=0,
-            )
-            for admin in admins:
+            for admin in entry.group.officers.all():
                 group = entry.group.nomen
                 person = admin.person.nomen
                 email = admin.person.email
                 cell = admin.person.cell_phone
-                row = [
+                yield [
                     group,
                     person,
                     email,
                     cell,
                 ]
-                ws.append(row)
-        file = save_virtual_workbook(wb)
-        content = ContentFile(file)
-        return content
 
+    def get_contact(self):
+        fieldnames = [
+            'group',
+            'admin',
+            'email',
+            'cell',
+        ]
+        return write_xlsx(fieldnames, self.get_contact_rows())
+
+
+    def get_fingerprint(self, template):
+        Appearance = apps.get_model('api.appearance')
+        Award = apps.get_model('api.award')
+        Chart = apps.get_model('api.chart')
+        Contestant = apps.get_model('api.contestant')
+        Convention = apps.get_model('api.convention')
+        Entry = apps.get_model('api.entry')
+        Group = apps.get_model('api.group')
+        Panelist = apps.get_model('api.panelist')
+        Person = apps.get_model('api.person')
+        Song = apps.get_model('api.song')
+        Score = apps.get_model('api.score')
+        Venue = apps.get_model('api.venue')
+        competitors = self.competitors.all()
+        contests = self.contests.all()
+        panelists = Panelist.objects.filter(round__session=self)
+        songs = Song.objects.filter(appearance__round__session=self)
+        querysets = [
+            competitors,
+            contests,
+            Appearance.objects.filter(round__session=self),
+            panelists,
+            songs,
+            Score.objects.filter(song__appearance__round__session=self),
+            # Rendered through the rows above
+            Convention.objects.filter(pk=self.convention_id),
+            Venue.objects.filter(conventions=self.convention_id),
+            Contestant.objects.filter(contest__session=self),
+            Award.objects.filter(id__in=contests.values('award')),
+            Entry.objects.filter(id__in=competitors.values('entry')),
+            Group.objects.filter(
+                Q(id__in=competitors.values('group')) |
+                Q(id__in=competitors.values('group__parent'))
+            ),
+            Chart.objects.filter(id__in=songs.values('chart')),
+            Person.objects.filter(id__in=panelists.values('person')),
+        ]
+        return get_report_fingerprint(template, self, querysets)
 
     def get_oss(self):
         Competitor = apps.get_model('api.competitor')
@@ -403,19 +457,6 @@ class Session(TimeStampedModel):
         competitors = self.competitors.filter(
             status=Competitor.STATUS.finished,
             is_private=False,
-        ).select_related(
-            'group',
-            'entry',
-        ).prefetch_related(
-            'entry__contestants',
-            'entry__contestants__contest',
-            'appearances',
-            'appearances__round',
-            'appearances__songs',
-            'appearances__songs__chart',
-            'appearances__songs__scores',
-            'appearances__songs__scores__panelist',
-            'appearances__songs__scores__panelist__person',
         ).order_by(
             'tot_rank',
             '-tot_points',
@@ -423,6 +464,7 @@ class Session(TimeStampedModel):
             '-per_points',
             'group__name',
         )
+        competitors = build_scoring_summary(competitors)
         # Eval Only
         privates = self.competitors.filter(
             status=Competitor.STATUS.finished,
@@ -444,36 +486,7 @@ class Session(TimeStampedModel):
         ).order_by(
             'award__tree_sort',
         )
-        # MonkeyPatch qualifiers
-        for contest in contests:
-            if contest.award.level != contest.award.LEVEL.deferred:
-                if contest.award.level == contest.award.LEVEL.qualifier:
-                    threshold = contest.award.threshold
-                    if threshold:
-                        qualifiers = contest.contestants.filter(
-                            status__gt=0,
-                            entry__competitor__tot_score__gte=threshold,
-                            entry__is_private=False,
-                        ).distinct(
-                        ).order_by(
-                            'entry__group__name',
-                        ).values_list(
-                            'entry__group__name',
-                            flat=True,
-                        )
-                        if qualifiers:
-                            contest.detail = ", ".join(
-                                qualifiers.values_list('entry__group__name', flat=True)
-                            )
-                        else:
-                            contest.detail = "(No qualifiers)"
-                else:
-                    if contest.group:
-                        contest.detail = str(contest.group.name)
-                    else:
-                        contest.detail = "(No recipient)"
-            else:
-                contest.detail = "(Result determined post-contest)"
+        contests = resolve_contest_details(contests)
         panelists = Panelist.objects.filter(
             round__session=self,
             kind=Panelist.KIND.official,
@@ -496,7 +509,7 @@ class Session(TimeStampedModel):
             'is_multi': False,
         }
         rendered = render_to_string('oss.html', context)
-        file = pydf.generate_pdf(
+        file = generate_pdf(
             rendered,
             page_size='Legal',
             orientation='Portrait',
@@ -506,6 +519,50 @@ class Session(TimeStampedModel):
         content = ContentFile(file)
         return content
 
+    def get_sa(self):
+        Competitor = apps.get_model('api.competitor')
+        Panelist = apps.get_model('api.panelist')
+        panelists = Panelist.objects.filter(
+            kind__in=[
+                Panelist.KIND.official,
+                Panelist.KIND.practice,
+            ],
+            scores__song__appearance__round__session=self,
+        ).select_related(
+            'person',
+        ).distinct(
+        ).order_by(
+            'category',
+            'person__last_name',
+        )
+        panel = [person for person, _ in groupby(
+            panelist.person for panelist in panelists
+        )]
+        competitors = self.competitors.filter(
+            status=Competitor.STATUS.finished,
+        ).order_by(
+            '-tot_points',
+            '-sng_points',
+            '-per_points',
+            'group__name',
+        )
+        competitors = build_scoring_summary(competitors, panel)
+        context = {
+            'session': self,
+            'panelists': panelists,
+            'panel': panel,
+            'competitors': competitors,
+        }
+        context.update(get_panel_counts(panelists))
+        rendered = render_to_string('sa.html', context)
+        file = generate_pdf(
+            rendered,
+            page_size='Letter',
+            orientation='Landscape',
+        )
+        content = ContentFile(file)
+        return content
+
     def queue_reports(self):
         subject = "[Barberscore] {0} Session Reports".format(
             self,
@@ -719,28 +776,26 @@ class Session(TimeStampedModel):
     )
     def close(self, *args, **kwargs):
         """Make session unavailable and set initial draw."""
-        # Remove orphaned entries
-        entries = self.entries.filter(
-            status=self.entries.model.STATUS.new,
-        )
-        for entry in entries:
-            entry.delete()
-        # Withdraw dangling invitations
-        entries = self.entries.filter(
-            status=self.entries.model.STATUS.invited,
-        )
-        for entry in entries:
-            entry.withdraw()
-            entry.save()
-        # Set initial draw for all Approved entries.
-        entries = self.entries.filter(
-            status=self.entries.model.STATUS.approved,
-        ).order_by('?')
-        i = 1
-        for entry in entries:
-            entry.draw = i
-            entry.save()
-            i += 1
+        with transaction.atomic():
+            # Hold the session so withdrawals wait until the draw is set
+            self.__class__.objects.select_for_update().get(pk=self.pk)
+            # Remove orphaned entries
+            self.entries.filter(
+                status=self.entries.model.STATUS.new,
+            ).delete()
+            # Withdraw dangling invitations
+            entries = self.entries.filter(
+                status=self.entries.model.STATUS.invited,
+            )
+            for entry in entries:
+                entry.withdraw()
+                entry.save()
+            # Set initial draw for all Approved entries.
+            assign_draws(
+                self.entries.filter(
+                    status=self.entries.model.STATUS.approved,
+                )
+            )
         # Notify for all public contests
         self.queue_notifications(template='session/closed.txt')
         return
@@ -775,50 +830,56 @@ class Session(TimeStampedModel):
         ).order_by(
             'award__tree_sort',
         )
-        i = 0
-        for contest in contests:
-            i += 1
+        contests = list(contests)
+        for i, contest in enumerate(contests, start=1):
             contest.num = i
-            contest.save()
+        bulk_update(contests, ['num'])
 
         # Build Competitor List
-        entries = self.entries.filter(
+        Competitor = apps.get_model('api.competitor')
+        Contestant = apps.get_model('api.contestant')
+        entries = list(self.entries.filter(
             status=self.entries.model.STATUS.approved,
+        ))
+        # One pass over every contestant row of the approved entries
+        multis = set()
+        legends = defaultdict(list)
+        contestants = Contestant.objects.filter(
+            entry__in=entries,
+            status__gt=Contestant.STATUS.new,
+        ).order_by(
+            'contest__num',
+        ).values_list(
+            'entry',
+            'status',
+            'contest__num',
+            'contest__award__rounds',
         )
-        for entry in entries:
+        for entry, status, num, rounds in contestants:
             # Set is_multi=True if they are competiting for at least
             # one multi-round award.
-            is_multi = bool(entry.contestants.filter(
-                contest__award__rounds__gt=1,
-                status__gt=0,
-            ))
+            if rounds > 1:
+                multis.add(entry)
             # Create the contesting legend
-            contestants = entry.contestants.filter(
-                status=entry.contestants.model.STATUS.included,
-            ).order_by(
-                'contest__num',
-            ).values_list(
-                'contest__num',
-                flat=True,
-            )
-            contestants = [str(x) for x in contestants]
-            if contestants:
-                contesting = ",".join(contestants)
-            else:
-                contesting = ""
-            # Create and start competitor
-            competitor = self.competitors.create(
+            if status == Contestant.STATUS.included:
+                legends[entry].append(str(num))
+        competitors = [
+            Competitor(
+                session=self,
                 entry=entry,
-                group=entry.group,
-                is_multi=is_multi,
+                group_id=entry.group_id,
+                is_multi=entry.id in multis,
                 is_private=entry.is_private,
                 participants=entry.participants,
                 representing=entry.representing,
-                contesting=contesting,
-            )
+                contesting=",".join(legends[entry.id]),
+            ) for entry in entries
+        ]
+        Competitor.objects.bulk_create(competitors)
+        # Start each competitor so the transitions are logged as before
+        for competitor in competitors:
             competitor.start()
-            # notify entrants  TODO Maybe competitor.start()?
-            competitor.save()
+        bulk_update(competitors, ['status'])
         #  Create and send the reports
         self.queue_reports()
         return
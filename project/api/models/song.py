@@ -13,11 +13,13 @@ from model_utils.models import TimeStampedModel
 # Django
 from django.apps import apps
 from django.db import models
-from django.db.models import Avg
-from django.db.models import Q
-from django.db.models import Sum, Min, Max, Count, StdDev
 from django.contrib.postgres.fields import ArrayField, JSONField
 
+# First-Party
+from api.utils import detect_variances
+from api.utils import get_song_stats
+from api.utils import score_aggregates
+
 log = logging.getLogger(__name__)
 
 
@@ -171,150 +173,38 @@ class Song(TimeStampedModel):
 
     # Methods
     def calculate(self):
+        totals = self.scores.aggregate(**score_aggregates())
+        for key, value in totals.items():
+            setattr(self, key, value)
+
+    def get_stats(self):
+        return get_song_stats([self])[self.id]
+
+    # Methods
+    def get_variances(self):
         Score = apps.get_model('api.score')
-        tot = Sum('points')
-        mus = Sum('points', filter=Q(category=Score.CATEGORY.music))
-        per = Sum('points', filter=Q(category=Score.CATEGORY.performance))
-        sng = Sum('points', filter=Q(category=Score.CATEGORY.singing))
-        officials = Score.objects.filter(
+        scores = Score.objects.filter(
             song=self,
             kind=Score.KIND.official,
-        ).annotate(
-            tot=tot,
-            mus=mus,
-            per=per,
-            sng=sng,
-        )
-        tot = officials.aggregate(
-            sum=Sum('points'),
-            avg=Avg('points'),
-        )
-        mus = officials.filter(
-            category=Score.CATEGORY.music,
-        ).aggregate(
-            sum=Sum('points'),
-            avg=Avg('points'),
-        )
-        per = officials.filter(
-            category=Score.CATEGORY.performance,
-        ).aggregate(
-            sum=Sum('points'),
-            avg=Avg('points'),
-        )
-        sng = officials.filter(
-            category=Score.CATEGORY.singing,
-        ).aggregate(
-            sum=Sum('points'),
-            avg=Avg('points'),
-        )
-        self.tot_points = tot['sum']
-        self.tot_score = tot['avg']
-        self.mus_points = mus['sum']
-        self.mus_score = mus['avg']
-        self.per_points = per['sum']
-        self.per_score = per['avg']
-        self.sng_points = sng['sum']
-        self.sng_score = sng['avg']
-
-    def get_stats(self):
-        stats = {}
-        totals = self.scores.filter(
-            kind=self.scores.model.KIND.official,
-        ).aggregate(
-            avg=Avg('points'),
-            sum=Sum('points'),
-            dev=StdDev('points'),
-        )
-        stats['tot'] = totals
-        category_map = {
-            30: 'mus',
-            40: 'per',
-            50: 'sng',
-        }
-        categories = self.scores.filter(
-            kind=self.scores.model.KIND.official,
-        ).values(
+        ).values_list(
+            'song',
             'category',
-        ).annotate(
-            avg=Avg('points'),
-            sum=Sum('points'),
-            dev=StdDev('points'),
+            'points',
         )
-        for category in categories:
-            name = category_map[category.pop('category')]
-            stats[name] = category
-        return stats
+        return detect_variances(scores).get(self.id, ([], []))
 
-    # Methods
     def get_asterisks(self):
         """Check to see if the score produces a category variance (asterisk)"""
-        asterisks = []
-        scores = self.scores.all()
-        categories = self.scores.filter(
-            kind=self.scores.model.KIND.official,
-        ).values(
-            'category',
-        ).annotate(
-            avg=Avg('points'),
-        )
-        for category in categories:
-            is_asterisk = [
-                abs(score.points - category['avg']) > 5
-                for score in scores
-                if score.category == category['category'] and score.kind == score.KIND.official
-            ][0]
-            if is_asterisk:
-                asterisks.append(category['category'])
+        asterisks, dixons = self.get_variances()
         return asterisks
 
     def get_dixons(self):
         # Dixon's Q Test
-        output = []
-        confidence = {
-            '3': 0.941,
-            '6': .56,
-            '9': .376,
-            '12': .437,
-            '15': .338,
-        }
-        scores = self.scores.filter(
-            kind=self.scores.model.KIND.official,
-        )
-        aggregates = scores.aggregate(
-            max=Max('points'),
-            min=Min('points'),
-            cnt=Count('id'),
-            spread=Max('points') - Min('points'),
-        )
-        # Bypass to avoid division by zero
-        if not aggregates['spread']:
-            return output
-        if aggregates['cnt'] < 3:
-            return RuntimeError('Panel too small error')
-        ascending = scores.order_by('points')
-        descending = scores.order_by('-points')
-        if aggregates['cnt'] == '3':
-            if abs(ascending[0].points - ascending[1].points) >= 10:
-                output.append(ascending[0].category)
-            if abs(descending[0].points - descending[1].points) >= 10:
-                output.append(descending[0].category)
-            return output
-        critical = confidence[str(aggregates['cnt'])]
-        ascending_distance = abs(ascending[0].points - ascending[1].points)
-        ascending_q = ascending_distance / aggregates['spread']
-        if ascending_q > critical and ascending_distance > 5:
-            output.append(ascending[0].category)
-        descending_distance = abs(descending[0].points - descending[1].points)
-        descending_q = descending_distance / aggregates['spread']
-        if descending_q > critical and descending_distance > 5:
-            output.append(descending[0].category)
-        return output
+        asterisks, dixons = self.get_variances()
+        return dixons
 
     def get_variance(self):
-        variance = any([
-            self.get_asterisks(),
-            self.get_dixons(),
-        ])
+        variance = any(self.get_variances())
         return variance
 
     # Permissions
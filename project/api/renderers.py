@@ -1,7 +1,12 @@
 
+# Standard Library
+import json
+
 # Third-Party
 from rest_framework.renderers import BaseRenderer
 from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework_csv.renderers import CSVStreamingRenderer
 from rest_framework_json_api.renderers import JSONRenderer
 
 
@@ -44,6 +49,36 @@ class XLSXRenderer(BaseRenderer):
         return data
 
 
+class NDJSONRenderer(BaseRenderer):
+    """Renders an iterable of rows lazily, one JSON object per line."""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, media_type=None, renderer_context=None):
+        for row in data:
+            yield json.dumps(row, cls=JSONEncoder) + '\n'
+
+
+class CSVExportRenderer(CSVStreamingRenderer):
+    """Streams rows as CSV, one column per field.
+
+    The base renderer flattens list and dict values into `field.0`,
+    `field.1` columns that fall outside the header, so array and JSON
+    fields are written as a JSON string in their own column instead.
+    """
+
+    def render(self, data, media_type=None, renderer_context={}):
+        rows = (
+            {
+                key: json.dumps(value, cls=JSONEncoder)
+                if isinstance(value, (list, dict)) else value
+                for key, value in row.items()
+            } for row in data
+        )
+        return super().render(rows, media_type, renderer_context)
+
+
 class NoGroupMembersJSONRenderer(JSONRenderer):
     # pass
     @classmethod
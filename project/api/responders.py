@@ -1,7 +1,15 @@
 
+# Standard Library
+import json
+
 # Third-Party
+from rest_framework import status
 from rest_framework.response import Response
 
+# Django
+from django.http import FileResponse
+from django.urls import reverse
+
 
 class PDFResponse(Response):
     def __init__(self, pdf, file_name, *args, **kwargs):
@@ -33,3 +41,59 @@ class XLSXResponse(Response):
             *args,
             **kwargs
         )
+
+
+class XLSXFileResponse(FileResponse):
+    """Streams a spooled workbook to the client in blocks."""
+
+    def __init__(self, xlsx, file_name, *args, **kwargs):
+        super().__init__(
+            xlsx,
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            *args,
+            **kwargs
+        )
+        self['Content-Disposition'] = 'filename="{}.xlsx"'.format(file_name)
+
+
+class JobResponse(Response):
+    """Points the client at a queued report job.
+
+    The body is pre-encoded so it passes through the binary PDF/XLSX renderers.
+    """
+
+    def __init__(self, job_id, *args, **kwargs):
+        location = reverse('report-detail', kwargs={'pk': job_id})
+        data = json.dumps({
+            'id': job_id,
+            'url': location,
+        }).encode('utf-8')
+        headers = {
+            'Location': location,
+        }
+        super().__init__(
+            data,
+            content_type='application/json',
+            status=status.HTTP_202_ACCEPTED,
+            headers=headers,
+            *args,
+            **kwargs
+        )
+
+
+class JobErrorResponse(Response):
+    """Reports a missing or failed report job.
+
+    The body is pre-encoded so it passes through the binary PDF/XLSX renderers.
+    """
+
+    def __init__(self, detail, *args, **kwargs):
+        data = json.dumps({
+            'status': detail,
+        }).encode('utf-8')
+        super().__init__(
+            data,
+            content_type='application/json',
+            *args,
+            **kwargs
+        )
@@ -10,13 +10,17 @@ import django_rq
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models.signals import post_delete
 from django.db.models.signals import post_save
 from django.db.models.signals import pre_delete
 from django.dispatch import receiver
 
 # Local
 from .models import Person
+from .models import Score
 from .models import User
+from .tasks import mark_songs_dirty
 
 
 @receiver(post_save, sender=User)
@@ -43,3 +47,21 @@ def user_pre_delete(sender, instance, **kwargs):
             instance.delete_account
         )
     return
+
+
+@receiver(post_save, sender=Score)
+def score_post_save(sender, instance, **kwargs):
+    song_id = instance.song_id
+    transaction.on_commit(
+        lambda: mark_songs_dirty([song_id])
+    )
+    return
+
+
+@receiver(post_delete, sender=Score)
+def score_post_delete(sender, instance, **kwargs):
+    song_id = instance.song_id
+    transaction.on_commit(
+        lambda: mark_songs_dirty([song_id])
+    )
+    return
@@ -3,9 +3,11 @@
 import csv
 import logging
 import time
+import uuid
 from io import BytesIO
 
 # Third-Party
+import django_rq
 import pydf
 from auth0.v3.authentication import GetToken
 from auth0.v3.exceptions import Auth0Error
@@ -14,6 +16,9 @@ from django_rq import job
 from openpyxl import Workbook
 from openpyxl.writer.excel import save_virtual_workbook
 from PyPDF2 import PdfFileMerger
+from rq import get_current_job
+from rq.exceptions import NoSuchJobError
+from rq.job import Job
 
 # Django
 from django.apps import apps
@@ -31,8 +36,24 @@ from django.utils.crypto import get_random_string
 from django.utils.text import slugify
 from django.utils.timezone import localdate
 
+# First-Party
+from api.utils import calculate_totals
+from api.utils import get_cached_report
+
 log = logging.getLogger(__name__)
 
+REPORT_JOB_TIMEOUT = 60 * 15
+
+REPORT_RESULT_TTL = 60 * 60
+
+# Song ids whose scores changed since the last recalculation
+DIRTY_SONGS = 'scores:dirty-songs'
+
+RECALCULATE_PENDING = 'scores:recalculate-pending'
+
+# Seconds a queued pass holds the pending flag, should it never run
+RECALCULATE_PENDING_TTL = 60
+
 
 def get_auth0():
     auth0_api_access_token = cache.get('auth0_api_access_token')
@@ -62,3 +83,130 @@ def get_accounts(path='barberscore.csv'):
         reader = csv.reader(f, skipinitialspace=True)
         rows = [row for row in reader]
         return rows
+
+
+def build_report(identity, label, pk, method, template=None):
+    """Generate a report artifact in the worker and return its bytes."""
+    try:
+        model = apps.get_model(label)
+        if pk is None:
+            target = model.objects
+        else:
+            target = model.objects.get(pk=pk)
+        generate = getattr(target, method)
+        if template:
+            content = get_cached_report(
+                target.get_fingerprint(template),
+                generate,
+            )
+        else:
+            content = generate()
+        return content.read()
+    finally:
+        # Release the slot so the next request builds fresh data, unless
+        # it expired or was re-claimed and now belongs to a newer job
+        current = get_current_job()
+        if current and cache.get(identity) == current.id:
+            cache.delete(identity)
+
+
+def queue_report(model, pk, method, file_name, kind, template=None, queue='default'):
+    """Queue a report build, coalescing identical in-flight requests.
+
+    Returns the id of the job that will hold the finished artifact.
+    """
+    identity = 'report-job:{0}:{1}:{2}'.format(
+        model._meta.label_lower,
+        pk,
+        method,
+    )
+    queue = django_rq.get_queue(queue)
+    job_id = str(uuid.uuid4())
+    if not cache.add(identity, job_id, timeout=REPORT_JOB_TIMEOUT):
+        # Already building; share that job while it is still live
+        current = cache.get(identity)
+        try:
+            if current and not Job.fetch(current, connection=queue.connection).is_failed:
+                return current
+        except NoSuchJobError:
+            pass
+        # The slot outlived its job; claim it for a new build
+        cache.set(identity, job_id, timeout=REPORT_JOB_TIMEOUT)
+    try:
+        report_job = queue.enqueue_call(
+            build_report,
+            args=(
+                identity,
+                model._meta.label,
+                pk,
+                method,
+                template,
+            ),
+            timeout=REPORT_JOB_TIMEOUT,
+            result_ttl=REPORT_RESULT_TTL,
+            job_id=job_id,
+            meta={
+                'file_name': file_name,
+                'kind': kind,
+            },
+        )
+    except Exception:
+        # Never hand out an id that was not enqueued
+        cache.delete(identity)
+        raise
+    return report_job.id
+
+
+def mark_songs_dirty(song_ids):
+    """Flag songs for recalculation and make sure a pass is queued."""
+    connection = django_rq.get_connection('high')
+    connection.sadd(DIRTY_SONGS, *song_ids)
+    if cache.add(RECALCULATE_PENDING, True, timeout=RECALCULATE_PENDING_TTL):
+        queue = django_rq.get_queue('high')
+        queue.enqueue(recalculate_scores)
+
+
+def recalculate_scores():
+    """Recompute totals and ranks affected by the dirty songs only."""
+    Song = apps.get_model('api.song')
+    Appearance = apps.get_model('api.appearance')
+    Competitor = apps.get_model('api.competitor')
+    Round = apps.get_model('api.round')
+    Session = apps.get_model('api.session')
+    # Edits made while this pass sat in the queue have joined it; reopen
+    # before draining so later edits queue another pass
+    cache.delete(RECALCULATE_PENDING)
+    connection = django_rq.get_connection('high')
+    pipe = connection.pipeline()
+    pipe.smembers(DIRTY_SONGS)
+    pipe.delete(DIRTY_SONGS)
+    song_ids, _ = pipe.execute()
+    song_ids = [song_id.decode() for song_id in song_ids]
+    if not song_ids:
+        return 0
+    # Verified and finished rounds keep the totals and ranks they were
+    # published with; Round.verify recalculates them when it re-runs
+    songs = Song.objects.filter(
+        id__in=song_ids,
+        appearance__round__status=Round.STATUS.started,
+    )
+    calculate_totals(songs, 'scores__')
+    appearances = Appearance.objects.filter(
+        id__in=songs.values('appearance'),
+    )
+    calculate_totals(appearances, 'songs__scores__')
+    competitors = Competitor.objects.filter(
+        id__in=appearances.values('competitor'),
+    )
+    calculate_totals(competitors, 'appearances__songs__scores__')
+    rounds = Round.objects.filter(
+        id__in=appearances.values('round'),
+    )
+    for round in rounds:
+        round.rank()
+    sessions = Session.objects.filter(
+        id__in=rounds.values('session'),
+    )
+    for session in sessions:
+        session.rank()
+    return len(song_ids)
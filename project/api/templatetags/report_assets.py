@@ -0,0 +1,50 @@
+# Standard Library
+import base64
+import mimetypes
+from functools import lru_cache
+
+# Django
+from django import template
+from django.contrib.staticfiles import finders
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+
+@lru_cache(maxsize=None)
+def read_asset(path):
+    # Resolve through the staticfiles finders so reports render before
+    # (and without) collectstatic, and never over the network.
+    location = finders.find(path)
+    if not location:
+        raise ValueError("Report asset not found: {0}".format(path))
+    with open(location, 'rb') as f:
+        return f.read()
+
+
+@register.simple_tag
+def inline_style(path):
+    css = read_asset(path).decode('utf-8')
+    return mark_safe('<style type="text/css">{0}</style>'.format(css))
+
+
+@register.simple_tag
+def inline_image(path):
+    content_type = mimetypes.guess_type(path)[0]
+    data = base64.b64encode(read_asset(path)).decode('ascii')
+    return 'data:{0};base64,{1}'.format(content_type, data)
+
+
+@register.simple_tag
+def font_face(family, path, weight):
+    # wkhtmltopdf does not handle variable fonts, so each weight is a
+    # static TrueType instance of its own.
+    data = base64.b64encode(read_asset(path)).decode('ascii')
+    return mark_safe(
+        "@font-face {{ font-family: '{0}'; font-style: normal; font-weight: {1}; "
+        "src: url(data:font/ttf;base64,{2}) format('truetype'); }}".format(
+            family,
+            weight,
+            data,
+        )
+    )
@@ -21,6 +21,7 @@ from .views import OfficeViewSet
 from .views import PanelistViewSet
 from .views import PersonViewSet
 from .views import RepertoryViewSet
+from .views import ReportViewSet
 from .views import RoundViewSet
 from .views import ScoreViewSet
 from .views import SessionViewSet
@@ -51,6 +52,7 @@ router.register(r'officer', OfficerViewSet)
 router.register(r'panelist', PanelistViewSet)
 router.register(r'person', PersonViewSet)
 router.register(r'repertory', RepertoryViewSet)
+router.register(r'report', ReportViewSet, base_name='report')
 router.register(r'round', RoundViewSet)
 router.register(r'score', ScoreViewSet)
 router.register(r'session', SessionViewSet)
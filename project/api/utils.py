@@ -0,0 +1,678 @@
+# Standard Library
+import hashlib
+import logging
+import math
+import random
+import subprocess
+from collections import defaultdict
+from functools import lru_cache
+from itertools import islice
+from tempfile import NamedTemporaryFile
+from threading import BoundedSemaphore
+
+# Third-Party
+from openpyxl import Workbook
+from pydf.wkhtmltopdf import WK_PATH
+
+# Django
+from django.apps import apps
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.db.models import Avg
+from django.db.models import Case
+from django.db.models import Count
+from django.db.models import Max
+from django.db.models import OuterRef
+from django.db.models import Q
+from django.db.models import StdDev
+from django.db.models import Subquery
+from django.db.models import Sum
+from django.db.models import Value
+from django.db.models import When
+from django.db.models import prefetch_related_objects
+from django.db.models.functions import Cast
+from django.template.loader import get_template
+from django.utils.timezone import now
+
+log = logging.getLogger(__name__)
+
+CATEGORIES = [
+    'tot',
+    'mus',
+    'per',
+    'sng',
+]
+
+# Bump when the context passed to report templates changes
+REPORT_VERSION = 1
+
+REPORT_TIMEOUT = 60 * 60 * 24
+
+# Concurrent wkhtmltopdf renders per process, and the limit for each
+PDF_RENDERERS = 4
+
+PDF_TIMEOUT = 60 * 2
+
+# Rows fetched per round trip when streaming exports
+XLSX_CHUNK_SIZE = 2000
+
+EXPORT_CHUNK_SIZE = 2000
+
+# Dixon's Q critical values by panel size
+DIXON_CRITICAL = {
+    6: .56,
+    9: .376,
+    12: .437,
+    15: .338,
+}
+
+
+def score_aggregates(prefix=''):
+    """Return the sum/avg aggregates for official scores by category.
+
+    Keys match the `<category>_points`/`<category>_score` fields on Song,
+    Appearance and Competitor; `prefix` is the lookup path to Score.
+    """
+    Score = apps.get_model('api.score')
+    points = '{0}points'.format(prefix)
+    official = Q(**{'{0}kind'.format(prefix): Score.KIND.official})
+    aggregates = {
+        'tot_points': Sum(points, filter=official),
+        'tot_score': Avg(points, filter=official),
+    }
+    categories = {
+        'mus': Score.CATEGORY.music,
+        'per': Score.CATEGORY.performance,
+        'sng': Score.CATEGORY.singing,
+    }
+    for name, category in categories.items():
+        condition = official & Q(**{'{0}category'.format(prefix): category})
+        aggregates['{0}_points'.format(name)] = Sum(points, filter=condition)
+        aggregates['{0}_score'.format(name)] = Avg(points, filter=condition)
+    return aggregates
+
+
+def calculate_totals(queryset, prefix):
+    """Recalculate score totals for every object in `queryset` at once.
+
+    One grouped query computes all the aggregates and one bulk UPDATE
+    writes them back.
+    """
+    aggregates = score_aggregates(prefix)
+    objects = list(queryset.annotate(**{
+        'calc_{0}'.format(key): value for key, value in aggregates.items()
+    }))
+    for o in objects:
+        for key in aggregates:
+            setattr(o, key, getattr(o, 'calc_{0}'.format(key)))
+    bulk_update(objects, aggregates.keys())
+    return objects
+
+
+def detect_variances(scores):
+    """Run the asterisk and Dixon's Q checks for many songs in one pass.
+
+    `scores` is an iterable of `(song, category, points)` rows for official
+    scores, typically a single `values_list` over a whole round or
+    appearance.  Returns `{song: (asterisks, dixons)}`.  Songs still
+    missing points are left out until their panel is complete, and Dixon's
+    test is only run for the panel sizes it has critical values for.
+    """
+    songs = defaultdict(list)
+    incomplete = set()
+    for song, category, points in scores:
+        if points is None:
+            incomplete.add(song)
+        else:
+            songs[song].append((points, category))
+    variances = {}
+    for song, rows in songs.items():
+        if song in incomplete:
+            continue
+        rows.sort()
+        variances[song] = (
+            _get_asterisks(rows),
+            _get_dixons(rows),
+        )
+    return variances
+
+
+def _get_asterisks(rows):
+    # Any score more than 5 points off its category average
+    categories = defaultdict(list)
+    for points, category in rows:
+        categories[category].append(points)
+    asterisks = []
+    for category, points in sorted(categories.items()):
+        average = sum(points) / len(points)
+        if any(abs(p - average) > 5 for p in points):
+            asterisks.append(category)
+    return asterisks
+
+
+def _get_dixons(rows):
+    # Dixon's Q Test on the lowest and highest scores; rows sorted ascending
+    output = []
+    count = len(rows)
+    if count != 3 and count not in DIXON_CRITICAL:
+        return output
+    spread = rows[-1][0] - rows[0][0]
+    # Bypass to avoid division by zero
+    if not spread:
+        return output
+    ascending_distance = rows[1][0] - rows[0][0]
+    descending_distance = rows[-1][0] - rows[-2][0]
+    if count == 3:
+        if ascending_distance >= 10:
+            output.append(rows[0][1])
+        if descending_distance >= 10:
+            output.append(rows[-1][1])
+        return output
+    critical = DIXON_CRITICAL[count]
+    if ascending_distance / spread > critical and ascending_distance > 5:
+        output.append(rows[0][1])
+    if descending_distance / spread > critical and descending_distance > 5:
+        output.append(rows[-1][1])
+    return output
+
+
+def build_scoring_summary(competitors, persons=None):
+    """Load everything the scoring summaries render in four flat queries.
+
+    Each competitor gets `appearance_list` (latest round first) and
+    `first_appearance`; each appearance a `song_list` in song order.  If
+    `persons` is given, each competitor also gets `columns`: for every
+    person, their points on each of the competitor's songs.
+    """
+    Appearance = apps.get_model('api.appearance')
+    Song = apps.get_model('api.song')
+    Score = apps.get_model('api.score')
+    competitors = list(competitors.select_related(
+        'group',
+        'group__parent',
+        'entry',
+    ))
+    appearances = {}
+    for appearance in Appearance.objects.filter(
+        competitor__in=competitors,
+    ).select_related(
+        'round',
+    ).order_by(
+        '-round__num',
+        'num',
+    ):
+        appearance.song_list = []
+        appearances[appearance.id] = appearance
+    songs = {}
+    for song in Song.objects.filter(
+        appearance__in=appearances.keys(),
+    ).select_related(
+        'chart',
+    ).order_by(
+        'num',
+    ):
+        song.score_list = []
+        appearances[song.appearance_id].song_list.append(song)
+        songs[song.id] = song
+    if persons is not None:
+        for song, person, points in Score.objects.filter(
+            song__in=songs.keys(),
+        ).values_list(
+            'song',
+            'panelist__person',
+            'points',
+        ):
+            songs[song].score_list.append((person, points))
+    by_competitor = defaultdict(list)
+    for appearance in appearances.values():
+        by_competitor[appearance.competitor_id].append(appearance)
+    for competitor in competitors:
+        competitor.appearance_list = by_competitor[competitor.id]
+        competitor.first_appearance = next(iter(competitor.appearance_list), None)
+        if persons is None:
+            continue
+        competitor.columns = [
+            [
+                points
+                for appearance in competitor.appearance_list
+                for song in appearance.song_list
+                for scorer, points in song.score_list
+                if scorer == person.id
+            ] for person in persons
+        ]
+    return competitors
+
+
+def get_panel_counts(panelists):
+    """Count the judges in `panelists` by category and kind in one query.
+
+    Returns the SA column spans, `{'mo_count': n, 'mp_count': n, ...}`,
+    keyed by category initial and official/practice kind.  Judges are
+    counted once each, as a multi-round session has a panelist row per
+    round but a single SA column per person.
+    """
+    Panelist = apps.get_model('api.panelist')
+    categories = {
+        Panelist.CATEGORY.music: 'm',
+        Panelist.CATEGORY.performance: 'p',
+        Panelist.CATEGORY.singing: 's',
+    }
+    kinds = {
+        Panelist.KIND.official: 'o',
+        Panelist.KIND.practice: 'p',
+    }
+    counts = {
+        '{0}{1}_count'.format(category, kind): 0
+        for category in categories.values() for kind in kinds.values()
+    }
+    rows = panelists.order_by(
+    ).values_list(
+        'category',
+        'kind',
+    ).annotate(
+        count=Count('person', distinct=True),
+    )
+    for category, kind, count in rows:
+        if category in categories and kind in kinds:
+            key = '{0}{1}_count'.format(categories[category], kinds[kind])
+            counts[key] = count
+    return counts
+
+
+def get_song_stats(songs):
+    """Official score statistics of many songs in one grouped query.
+
+    Returns `{song: {'tot': {...}, 'mus': {...}, ...}}` holding the avg,
+    sum and (population) dev of the points.  The totals are pooled from
+    the per-category groups rather than aggregated a second time.
+    """
+    Score = apps.get_model('api.score')
+    names = {
+        Score.CATEGORY.music: 'mus',
+        Score.CATEGORY.performance: 'per',
+        Score.CATEGORY.singing: 'sng',
+    }
+    songs = list(songs)
+    stats = {
+        song.id: {'tot': {'avg': None, 'sum': None, 'dev': None}}
+        for song in songs
+    }
+    rows = Score.objects.filter(
+        song__in=songs,
+        kind=Score.KIND.official,
+    ).order_by(
+    ).values_list(
+        'song',
+        'category',
+    ).annotate(
+        count=Count('points'),
+        avg=Avg('points'),
+        sum=Sum('points'),
+        dev=StdDev('points'),
+    )
+    groups = defaultdict(list)
+    for song, category, count, avg, total, dev in rows:
+        stats[song][names[category]] = {'avg': avg, 'sum': total, 'dev': dev}
+        if count:
+            groups[song].append((count, avg, total, dev))
+    for song, values in groups.items():
+        count = sum(value[0] for value in values)
+        total = sum(value[2] for value in values)
+        avg = total / count
+        square = sum(n * (dev ** 2 + mean ** 2) for n, mean, _, dev in values)
+        stats[song]['tot'] = {
+            'avg': avg,
+            'sum': total,
+            'dev': math.sqrt(max(square / count - avg ** 2, 0)),
+        }
+    return stats
+
+
+def get_repertoire_history(round):
+    """Every song sung in the session by the competitors of `round`.
+
+    One joined query over the songs.  Returns `{competitor: [song, ...]}`
+    in round and song order, each song a dict of its round, number and
+    chart (`title` is None when the chart is not in the repertory).
+    """
+    Song = apps.get_model('api.song')
+    Round = apps.get_model('api.round')
+    kinds = dict(Round.KIND)
+    rows = Song.objects.filter(
+        appearance__competitor__appearances__round=round,
+    ).order_by(
+        'appearance__competitor',
+        'appearance__round__num',
+        'num',
+    ).values_list(
+        'appearance__competitor',
+        'appearance__round__kind',
+        'num',
+        'chart',
+        'chart__title',
+        'chart__arrangers',
+    )
+    history = defaultdict(list)
+    for competitor, kind, num, chart, title, arrangers in rows:
+        if chart:
+            title = "{0} [{1}]".format(title, arrangers)
+        history[competitor].append({
+            'round': kinds[kind],
+            'num': num,
+            'chart': chart,
+            'title': title,
+        })
+    return history
+
+
+def get_contest_outcomes(contests):
+    """Resolve the qualifiers of many contests at once.
+
+    One query over the active contestants of all `contests`.  Returns
+    `{contest: {'qualifiers': [group names]}}`, the public groups at or
+    above the award threshold.
+    """
+    Contestant = apps.get_model('api.contestant')
+    contests = list(contests)
+    outcomes = {
+        contest.id: {'qualifiers': set()} for contest in contests
+    }
+    thresholds = {
+        contest.id: contest.award.threshold for contest in contests
+    }
+    rows = Contestant.objects.filter(
+        contest__in=contests,
+        status__gt=0,
+        entry__is_private=False,
+    ).values_list(
+        'contest',
+        'entry__group__name',
+        'entry__competitor__tot_score',
+    )
+    for contest, name, tot_score in rows:
+        threshold = thresholds[contest]
+        if threshold and tot_score is not None and tot_score >= threshold:
+            outcomes[contest]['qualifiers'].add(name)
+    for outcome in outcomes.values():
+        outcome['qualifiers'] = sorted(outcome['qualifiers'])
+    return outcomes
+
+
+def resolve_contest_details(contests, round=None):
+    """Set the `detail` line the scoring summaries print for each contest.
+
+    With `round`, contests are reported as of that round; otherwise as of
+    the end of the session.
+    """
+    contests = list(contests)
+    outcomes = get_contest_outcomes(contests)
+    for contest in contests:
+        award = contest.award
+        if round and round.num < award.rounds:
+            contest.detail = "(Result not yet determined)"
+        elif award.level == award.LEVEL.deferred:
+            contest.detail = "(Result determined post-contest)"
+        elif award.level == award.LEVEL.qualifier:
+            if not award.threshold:
+                contest.detail = ""
+                continue
+            qualifiers = outcomes[contest.id]['qualifiers']
+            if qualifiers:
+                contest.detail = ", ".join(qualifiers)
+            else:
+                contest.detail = "(No qualifiers)"
+        elif contest.group:
+            contest.detail = str(contest.group.name)
+        elif round:
+            contest.detail = "(Result announced following Finals)"
+        else:
+            contest.detail = "(No recipient)"
+    return contests
+
+
+def determine_contests(contests):
+    """Award each points-decided contest in `contests` to its leader.
+
+    Every leader comes from one correlated subquery over the contestants
+    and the multi-round check is a single query for all sessions.
+    Returns the determined contests, for the caller to save.
+    """
+    Contestant = apps.get_model('api.contestant')
+    Competitor = apps.get_model('api.competitor')
+    Award = apps.get_model('api.award')
+    leaders = Contestant.objects.filter(
+        contest=OuterRef('pk'),
+        status__gt=0,
+    ).order_by(
+        '-entry__competitor__tot_points',
+        '-entry__competitor__sng_points',
+        '-entry__competitor__per_points',
+    ).values(
+        'entry__group',
+    )[:1]
+    contests = list(contests.exclude(
+        award__level__in=[
+            Award.LEVEL.qualifier,
+            Award.LEVEL.top,
+            Award.LEVEL.manual,
+            Award.LEVEL.deferred,
+        ],
+    ).annotate(
+        leader=Subquery(leaders),
+    ))
+    # Only award once there are multi-round competitors in a draw
+    multis = set(Competitor.objects.filter(
+        session__in=[contest.session_id for contest in contests],
+        appearances__draw__gt=0,
+        is_multi=True,
+    ).values_list(
+        'session',
+        flat=True,
+    ))
+    for contest in contests:
+        if contest.session_id in multis:
+            contest.group_id = contest.leader
+        else:
+            contest.group_id = None
+    return contests
+
+
+def assign_ranks(objects, categories=CATEGORIES):
+    """Set `<category>_rank` from `<category>_points` on each object in memory.
+
+    Ties share the highest rank and the next rank skips (1224), which is
+    what `Ranking.rank()` returns for both the ORDINAL and standard strategies.
+    Objects without points are left unranked.
+    """
+    objects = list(objects)
+    fields = []
+    for category in categories:
+        points_field = '{0}_points'.format(category)
+        rank_field = '{0}_rank'.format(category)
+        points = sorted(
+            [getattr(o, points_field) for o in objects if getattr(o, points_field) is not None],
+            reverse=True,
+        )
+        ranks = {}
+        for i, value in enumerate(points, start=1):
+            ranks.setdefault(value, i)
+        for o in objects:
+            setattr(o, rank_field, ranks.get(getattr(o, points_field)))
+        fields.append(rank_field)
+    return fields
+
+
+def assign_draws(queryset):
+    """Shuffle the rows of `queryset` into draw order 1..n with one write.
+
+    Must run inside a transaction; the rows stay locked until it commits.
+    """
+    objects = list(queryset.select_for_update())
+    random.shuffle(objects)
+    for i, o in enumerate(objects, start=1):
+        o.draw = i
+    bulk_update(objects, ['draw'])
+    return objects
+
+
+def bulk_update(objects, fields, batch_size=500):
+    """Write `fields` for all objects with a single UPDATE per batch.
+
+    Bypasses `save()` (and therefore FSM logging), but touches `modified`
+    on TimeStampedModels so change tracking still works.
+    """
+    objects = list(objects)
+    if not objects:
+        return 0
+    model = type(objects[0])
+    fields = [model._meta.get_field(name) for name in fields]
+    try:
+        stamp_field = model._meta.get_field('modified')
+    except FieldDoesNotExist:
+        stamp_field = None
+    stamp = now()
+    updated = 0
+    for i in range(0, len(objects), batch_size):
+        batch = objects[i:i + batch_size]
+        updates = {}
+        for field in fields:
+            whens = [
+                When(
+                    pk=o.pk,
+                    then=Value(getattr(o, field.attname), output_field=field),
+                ) for o in batch
+            ]
+            updates[field.attname] = Cast(
+                Case(*whens, output_field=field),
+                output_field=field,
+            )
+        if stamp_field and stamp_field not in fields:
+            updates[stamp_field.attname] = stamp
+            for o in batch:
+                setattr(o, stamp_field.attname, stamp)
+        updated += model._default_manager.filter(
+            pk__in=[o.pk for o in batch],
+        ).update(**updates)
+    return updated
+
+
+@lru_cache(maxsize=None)
+def get_template_version(template):
+    source = get_template(template).template.source
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()
+
+
+def get_report_fingerprint(template, instance, querysets):
+    """Fingerprint everything a rendered report depends on.
+
+    Any change to the instance, to a row in one of `querysets` (including
+    additions and deletions) or to the template source yields a new value.
+    """
+    parts = [
+        REPORT_VERSION,
+        template,
+        get_template_version(template),
+        instance._meta.label,
+        str(instance.pk),
+        instance.status,
+        instance.modified.isoformat(),
+    ]
+    for queryset in querysets:
+        aggregates = queryset.order_by().aggregate(
+            modified=Max('modified'),
+            count=Count('pk'),
+        )
+        parts.append(
+            (
+                queryset.model._meta.label,
+                aggregates['count'],
+                aggregates['modified'].isoformat() if aggregates['modified'] else None,
+            )
+        )
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+def get_cached_report(fingerprint, generate):
+    """Return the report for `fingerprint`, rendering it only on a miss."""
+    key = 'report:{0}'.format(fingerprint)
+    data = cache.get(key)
+    if data is None:
+        data = generate().read()
+        cache.set(key, data, REPORT_TIMEOUT)
+    return ContentFile(data)
+
+
+_renderers = BoundedSemaphore(PDF_RENDERERS)
+
+
+def generate_pdf(html, timeout=PDF_TIMEOUT, **options):
+    """Render `html` to PDF bytes; a drop-in for `pydf.generate_pdf`.
+
+    Renders are drawn from a bounded pool so parallel callers cannot
+    oversubscribe the worker, and a stuck render is killed after `timeout`.
+    Keyword options map to wkhtmltopdf flags as they do in pydf.
+    """
+    args = [WK_PATH, '--quiet']
+    for name, value in options.items():
+        if value is None or value is False:
+            continue
+        args.append('--{0}'.format(name.replace('_', '-')))
+        if value is not True:
+            args.append(str(value))
+    # Read from stdin and write to stdout; no temp files
+    args.extend(['-', '-'])
+    with _renderers:
+        try:
+            result = subprocess.run(
+                args,
+                input=html.encode('utf-8'),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                timeout=timeout,
+            )
+        except subprocess.TimeoutExpired:
+            raise RuntimeError("PDF render timed out after {0}s".format(timeout))
+    pdf = result.stdout
+    # wkhtmltopdf exit codes are unreliable; trust the output if it's a PDF
+    if result.returncode and pdf[:4] != b'%PDF':
+        raise RuntimeError(
+            "PDF render failed: {0}".format(result.stderr.decode().strip())
+        )
+    return pdf
+
+
+def iterate_prefetched(queryset, *lookups, chunk_size=XLSX_CHUNK_SIZE):
+    """Stream `queryset` with `lookups` prefetched one chunk at a time.
+
+    `.iterator()` skips `prefetch_related`, so each chunk of rows off the
+    server-side cursor is prefetched in one query per lookup before it is
+    yielded.
+    """
+    rows = queryset.iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        prefetch_related_objects(chunk, *lookups)
+        yield from chunk
+
+
+def write_xlsx(fieldnames, rows):
+    """Write `rows` under a `fieldnames` header as a spooled workbook.
+
+    openpyxl's write-only mode flushes each row as it is appended and the
+    zip is saved straight to a temporary file, so with `rows` drawn from
+    `.iterator(chunk_size=XLSX_CHUNK_SIZE)` querysets the export runs in
+    constant memory.  Returns a `File` to stream or save to storage.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(fieldnames)
+    for row in rows:
+        ws.append(row)
+    output = NamedTemporaryFile(suffix='.xlsx')
+    wb.save(output)
+    output.seek(0)
+    return File(output)
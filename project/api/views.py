@@ -3,7 +3,7 @@
 import logging
 
 # Third-Party
-import pydf
+import django_rq
 from rest_framework_json_api.filters import OrderingFilter
 from rest_framework_json_api.django_filters import DjangoFilterBackend
 from django_fsm import TransitionNotAllowed
@@ -12,14 +12,17 @@ from dry_rest_permissions.generics import DRYPermissions
 from rest_framework import status
 from rest_framework import viewsets
 from rest_framework.decorators import action
+from rest_framework.fields import BooleanField
 from rest_framework.permissions import AllowAny
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rq.exceptions import NoSuchJobError
+from rq.job import Job
 
 # Django
 from django.core.files.base import ContentFile
-from django.db.models import Sum
-from django.template.loader import render_to_string
+from django.http import StreamingHttpResponse
 from django.utils.text import slugify
 
 # Local
@@ -57,9 +60,14 @@ from .models import Session
 from .models import Song
 from .models import User
 from .models import Venue
+from .renderers import CSVExportRenderer
+from .renderers import NDJSONRenderer
 from .renderers import PDFRenderer
 from .renderers import XLSXRenderer
+from .responders import JobErrorResponse
+from .responders import JobResponse
 from .responders import PDFResponse
+from .responders import XLSXFileResponse
 from .responders import XLSXResponse
 from .serializers import AppearanceSerializer
 from .serializers import AssignmentSerializer
@@ -86,9 +94,50 @@ from .serializers import SongSerializer
 from .serializers import StateLogSerializer
 from .serializers import UserSerializer
 from .serializers import VenueSerializer
+from .tasks import queue_report
+from .utils import EXPORT_CHUNK_SIZE
+from .utils import get_cached_report
+from .utils import get_repertoire_history
 
 log = logging.getLogger(__name__)
 
+# Only jobs queued by `queue_report` are exposed through the report endpoint
+REPORT_FUNC_NAME = 'api.tasks.build_report'
+
+
+def is_async(request):
+    value = request.query_params.get('async', '')
+    return value.lower() in BooleanField.TRUE_VALUES
+
+
+class ExportMixin(object):
+    """Streams the whole (filtered) table as CSV or NDJSON.
+
+    Rows come off a server-side cursor, so `export?format=ndjson` pulls a
+    full table in one request at flat memory on both ends.
+    """
+
+    @action(methods=['get'], detail=False, renderer_classes=[CSVExportRenderer, NDJSONRenderer])
+    def export(self, request):
+        queryset = self.filter_queryset(
+            self.get_queryset().order_by('pk'),
+        )
+        model = queryset.model
+        fields = [field.attname for field in model._meta.concrete_fields]
+        rows = queryset.values(
+            *fields
+        ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.render(rows, renderer_context={'header': fields}),
+            content_type=renderer.media_type,
+        )
+        response['Content-Disposition'] = 'attachment; filename="{0}.{1}"'.format(
+            model._meta.model_name,
+            renderer.format,
+        )
+        return response
+
 
 class AppearanceViewSet(viewsets.ModelViewSet):
     queryset = Appearance.objects.select_related(
@@ -258,7 +307,7 @@ class AwardViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class ChartViewSet(viewsets.ModelViewSet):
+class ChartViewSet(ExportMixin, viewsets.ModelViewSet):
     queryset = Chart.objects.select_related(
     ).prefetch_related(
         'repertories',
@@ -306,9 +355,19 @@ class ChartViewSet(viewsets.ModelViewSet):
 
     @action(methods=['get'], detail=False, renderer_classes=[XLSXRenderer], permission_classes=[AllowAny])
     def report(self, request):
-        xlsx = Chart.objects.get_report()
         file_name = 'chart-report'
-        return XLSXResponse(
+        if is_async(request):
+            job_id = queue_report(
+                Chart,
+                None,
+                'get_report',
+                file_name,
+                'xlsx',
+                queue='default',
+            )
+            return JobResponse(job_id)
+        xlsx = Chart.objects.get_report()
+        return XLSXFileResponse(
             xlsx,
             file_name=file_name,
             status=status.HTTP_200_OK
@@ -667,7 +726,7 @@ class GrantorViewSet(viewsets.ModelViewSet):
     resource_name = "grantor"
 
 
-class GroupViewSet(viewsets.ModelViewSet):
+class GroupViewSet(ExportMixin, viewsets.ModelViewSet):
     queryset = Group.objects.select_related(
         'parent',
     ).prefetch_related(
@@ -723,7 +782,6 @@ class GroupViewSet(viewsets.ModelViewSet):
     @action(methods=['get'], detail=True, renderer_classes=[XLSXRenderer], permission_classes=[AllowAny])
     def roster(self, request, pk=None):
         group = Group.objects.get(pk=pk)
-        xlsx = group.get_roster()
         file_name = '{0}-roster'.format(
             slugify(
                 "{0}".format(
@@ -731,7 +789,18 @@ class GroupViewSet(viewsets.ModelViewSet):
                 )
             )
         )
-        return XLSXResponse(
+        if is_async(request):
+            job_id = queue_report(
+                Group,
+                group.pk,
+                'get_roster',
+                file_name,
+                'xlsx',
+                queue='default',
+            )
+            return JobResponse(job_id)
+        xlsx = group.get_roster()
+        return XLSXFileResponse(
             xlsx,
             file_name=file_name,
             status=status.HTTP_200_OK
@@ -744,16 +813,26 @@ class GroupViewSet(viewsets.ModelViewSet):
         permission_classes=[AllowAny],
     )
     def quartets(self, request):
-        xlsx = Group.objects.get_quartets()
         file_name = 'quartets-report'
-        return XLSXResponse(
+        if is_async(request):
+            job_id = queue_report(
+                Group,
+                None,
+                'get_quartets',
+                file_name,
+                'xlsx',
+                queue='default',
+            )
+            return JobResponse(job_id)
+        xlsx = Group.objects.get_quartets()
+        return XLSXFileResponse(
             xlsx,
             file_name=file_name,
             status=status.HTTP_200_OK
         )
 
 
-class MemberViewSet(viewsets.ModelViewSet):
+class MemberViewSet(ExportMixin, viewsets.ModelViewSet):
     queryset = Member.objects.select_related(
         'group',
         'person',
@@ -818,7 +897,7 @@ class OfficeViewSet(viewsets.ModelViewSet):
     resource_name = "office"
 
 
-class OfficerViewSet(viewsets.ModelViewSet):
+class OfficerViewSet(ExportMixin, viewsets.ModelViewSet):
     queryset = Officer.objects.select_related(
         'office',
         'person',
@@ -887,7 +966,7 @@ class PanelistViewSet(viewsets.ModelViewSet):
     resource_name = "panelist"
 
 
-class PersonViewSet(viewsets.ModelViewSet):
+class PersonViewSet(ExportMixin, viewsets.ModelViewSet):
     queryset = Person.objects.select_related(
         'user',
     ).prefetch_related(
@@ -985,6 +1064,69 @@ class RepertoryViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
+class ReportViewSet(viewsets.ViewSet):
+    """Status and download of queued report jobs."""
+    permission_classes = [
+        AllowAny,
+    ]
+    resource_name = False
+
+    def get_job(self, pk):
+        job = Job.fetch(
+            pk,
+            connection=django_rq.get_connection('default'),
+        )
+        if job.func_name != REPORT_FUNC_NAME:
+            raise NoSuchJobError(pk)
+        if not {'kind', 'file_name'} <= set(job.meta):
+            raise NoSuchJobError(pk)
+        return job
+
+    def retrieve(self, request, pk=None):
+        try:
+            job = self.get_job(pk)
+        except NoSuchJobError:
+            return Response(
+                {'status': 'Report not found.'},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return Response({
+            'id': job.id,
+            'status': job.get_status(),
+            'file_name': job.meta['file_name'],
+            'kind': job.meta['kind'],
+        })
+
+    @action(methods=['get'], detail=True, renderer_classes=[PDFRenderer, XLSXRenderer], permission_classes=[AllowAny])
+    def download(self, request, pk=None):
+        try:
+            job = self.get_job(pk)
+        except NoSuchJobError:
+            return JobErrorResponse(
+                'Report not found.',
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        if job.is_failed:
+            return JobErrorResponse(
+                'Report failed.',
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+        if not job.is_finished:
+            return JobResponse(job.id)
+        content = ContentFile(job.result)
+        if job.meta['kind'] == 'xlsx':
+            return XLSXResponse(
+                content,
+                file_name=job.meta['file_name'],
+                status=status.HTTP_200_OK
+            )
+        return PDFResponse(
+            content,
+            file_name=job.meta['file_name'],
+            status=status.HTTP_200_OK
+        )
+
+
 class RoundViewSet(viewsets.ModelViewSet):
     queryset = Round.objects.select_related(
         'session',
@@ -1093,52 +1235,14 @@ class RoundViewSet(viewsets.ModelViewSet):
 
     @action(methods=['get'], detail=True, renderer_classes=[PDFRenderer], permission_classes=[AllowAny])
     def announcements(self, request, pk=None):
-        round = Round.objects.get(pk=pk)
-        appearances = round.appearances.filter(
-            draw__gt=0,
-        ).select_related(
-            'competitor__group',
-        ).order_by(
-            'draw',
-        )
-        mt = round.appearances.filter(
-            draw=0,
-        ).select_related(
-            'competitor__group',
-        ).order_by(
-            'competitor__group__name',
+        round = Round.objects.select_related(
+            'session',
+            'session__convention',
+        ).get(pk=pk)
+        pdf = get_cached_report(
+            round.get_fingerprint('announcements.html'),
+            round.get_announcements,
         )
-        contests = round.session.contests.filter(
-            num__isnull=False,
-            group__isnull=False,
-        ).order_by('num')
-        if round.kind == round.KIND.finals:
-            competitors = round.session.competitors.filter(
-                status__in=[
-                    Competitor.STATUS.finished,
-                    Competitor.STATUS.started,
-                ],
-                tot_rank__lte=5,
-            ).select_related(
-                'group',
-            ).order_by(
-                '-tot_rank',
-            )
-        else:
-            competitors = None
-        pos = round.appearances.aggregate(sum=Sum('pos'))['sum']
-        context = {
-            'round': round,
-            'appearances': appearances,
-            'mt': mt,
-            'contests': contests,
-            'competitors': competitors,
-            'pos': pos,
-        }
-        rendered = render_to_string('announcements.html', context)
-        file = pydf.generate_pdf(rendered)
-        content = ContentFile(file)
-        pdf = content
         file_name = '{0}-announcements'.format(
             slugify(
                 "{0} {1} {2} Announcements".format(
@@ -1169,7 +1273,6 @@ class RoundViewSet(viewsets.ModelViewSet):
             'session__convention',
             'session__convention__venue',
         ).get(pk=pk)
-        pdf = round.get_csa()
         file_name = '{0}-csa'.format(
             slugify(
                 "{0} {1} {2} Round".format(
@@ -1179,6 +1282,21 @@ class RoundViewSet(viewsets.ModelViewSet):
                 )
             )
         )
+        if is_async(request):
+            job_id = queue_report(
+                Round,
+                round.pk,
+                'get_csa',
+                file_name,
+                'pdf',
+                template='csa.html',
+                queue='high',
+            )
+            return JobResponse(job_id)
+        pdf = get_cached_report(
+            round.get_fingerprint('csa.html'),
+            round.get_csa,
+        )
         # return Response(
         #     pdf,
         #     template_name='oss.html',
@@ -1205,7 +1323,6 @@ class RoundViewSet(viewsets.ModelViewSet):
             'session__convention',
             'session__convention__venue',
         ).get(pk=pk)
-        pdf = round.get_oss()
         file_name = '{0}-oss'.format(
             slugify(
                 "{0} {1} {2} Round".format(
@@ -1215,6 +1332,21 @@ class RoundViewSet(viewsets.ModelViewSet):
                 )
             )
         )
+        if is_async(request):
+            job_id = queue_report(
+                Round,
+                round.pk,
+                'get_oss',
+                file_name,
+                'pdf',
+                template='oss.html',
+                queue='high',
+            )
+            return JobResponse(job_id)
+        pdf = get_cached_report(
+            round.get_fingerprint('oss.html'),
+            round.get_oss,
+        )
         # return Response(
         #     pdf,
         #     template_name='oss.html',
@@ -1239,7 +1371,6 @@ class RoundViewSet(viewsets.ModelViewSet):
         round = Round.objects.prefetch_related(
             'appearances',
         ).get(pk=pk)
-        pdf = round.get_sung()
         file_name = '{0}-sung-report'.format(
             slugify(
                 "{0} {1} {2} Round".format(
@@ -1249,6 +1380,17 @@ class RoundViewSet(viewsets.ModelViewSet):
                 )
             )
         )
+        if is_async(request):
+            job_id = queue_report(
+                Round,
+                round.pk,
+                'get_sung',
+                file_name,
+                'pdf',
+                queue='high',
+            )
+            return JobResponse(job_id)
+        pdf = round.get_sung()
         # return Response(
         #     pdf,
         #     template_name='oss.html',
@@ -1260,6 +1402,24 @@ class RoundViewSet(viewsets.ModelViewSet):
         )
 
 
+    @action(methods=['get'], detail=True, renderer_classes=[JSONRenderer])
+    def repertoire(self, request, pk=None):
+        round = self.get_object()
+        history = get_repertoire_history(round)
+        competitors = round.session.competitors.filter(
+            appearances__round=round,
+        ).select_related(
+            'group',
+        ).order_by(
+            'group__name',
+        )
+        data = [{
+            'competitor': competitor.id,
+            'group': competitor.group.name,
+            'songs': history.get(competitor.id, []),
+        } for competitor in competitors]
+        return Response(data)
+
     @action(methods=['get'], detail=True, renderer_classes=[PDFRenderer], permission_classes=[AllowAny])
     def sadraft(self, request, pk=None):
         round = Round.objects.select_related(
@@ -1267,7 +1427,6 @@ class RoundViewSet(viewsets.ModelViewSet):
             'session__convention',
             'session__convention__venue',
         ).get(pk=pk)
-        pdf = round.get_sa()
         file_name = '{0}-sa'.format(
             slugify(
                 "{0} {1} {2} Round".format(
@@ -1277,6 +1436,21 @@ class RoundViewSet(viewsets.ModelViewSet):
                 )
             )
         )
+        if is_async(request):
+            job_id = queue_report(
+                Round,
+                round.pk,
+                'get_sa',
+                file_name,
+                'pdf',
+                template='sa.html',
+                queue='high',
+            )
+            return JobResponse(job_id)
+        pdf = get_cached_report(
+            round.get_fingerprint('sa.html'),
+            round.get_sa,
+        )
         return PDFResponse(
             pdf,
             file_name=file_name,
@@ -1284,7 +1458,7 @@ class RoundViewSet(viewsets.ModelViewSet):
         )
 
 
-class ScoreViewSet(viewsets.ModelViewSet):
+class ScoreViewSet(ExportMixin, viewsets.ModelViewSet):
     queryset = Score.objects.select_related(
         'song',
         'panelist',
@@ -1412,7 +1586,6 @@ class SessionViewSet(viewsets.ModelViewSet):
     @action(methods=['get'], detail=True, renderer_classes=[XLSXRenderer], permission_classes=[AllowAny])
     def legacy(self, request, pk=None):
         session = Session.objects.get(pk=pk)
-        xlsx = session.get_legacy()
         file_name = '{0}-legacy'.format(
             slugify(
                 "{0} {1} Session".format(
@@ -1421,7 +1594,18 @@ class SessionViewSet(viewsets.ModelViewSet):
                 )
             )
         )
-        return XLSXResponse(
+        if is_async(request):
+            job_id = queue_report(
+                Session,
+                session.pk,
+                'get_legacy',
+                file_name,
+                'xlsx',
+                queue='default',
+            )
+            return JobResponse(job_id)
+        xlsx = session.get_legacy()
+        return XLSXFileResponse(
             xlsx,
             file_name=file_name,
             status=status.HTTP_200_OK
@@ -1430,7 +1614,6 @@ class SessionViewSet(viewsets.ModelViewSet):
     @action(methods=['get'], detail=True, renderer_classes=[XLSXRenderer], permission_classes=[AllowAny])
     def drcj(self, request, pk=None):
         session = Session.objects.get(pk=pk)
-        xlsx = session.get_drcj()
         file_name = '{0}-drcj'.format(
             slugify(
                 "{0} {1} Session".format(
@@ -1439,7 +1622,18 @@ class SessionViewSet(viewsets.ModelViewSet):
                 )
             )
         )
-        return XLSXResponse(
+        if is_async(request):
+            job_id = queue_report(
+                Session,
+                session.pk,
+                'get_drcj',
+                file_name,
+                'xlsx',
+                queue='default',
+            )
+            return JobResponse(job_id)
+        xlsx = session.get_drcj()
+        return XLSXFileResponse(
             xlsx,
             file_name=file_name,
             status=status.HTTP_200_OK
@@ -1448,7 +1642,6 @@ class SessionViewSet(viewsets.ModelViewSet):
     @action(methods=['get'], detail=True, renderer_classes=[XLSXRenderer], permission_classes=[AllowAny])
     def contact(self, request, pk=None):
         session = Session.objects.get(pk=pk)
-        xlsx = session.get_contact()
         file_name = '{0}-contact'.format(
             slugify(
                 "{0} {1} Session".format(
@@ -1457,7 +1650,18 @@ class SessionViewSet(viewsets.ModelViewSet):
                 )
             )
         )
-        return XLSXResponse(
+        if is_async(request):
+            job_id = queue_report(
+                Session,
+                session.pk,
+                'get_contact',
+                file_name,
+                'xlsx',
+                queue='default',
+            )
+            return JobResponse(job_id)
+        xlsx = session.get_contact()
+        return XLSXFileResponse(
             xlsx,
             file_name=file_name,
             status=status.HTTP_200_OK
@@ -1477,7 +1681,6 @@ class SessionViewSet(viewsets.ModelViewSet):
             'convention',
             'convention__venue',
         ).get(pk=pk)
-        pdf = session.get_oss()
         file_name = '{0}-oss'.format(
             slugify(
                 "{0} {1} Session".format(
@@ -1486,6 +1689,21 @@ class SessionViewSet(viewsets.ModelViewSet):
                 )
             )
         )
+        if is_async(request):
+            job_id = queue_report(
+                Session,
+                session.pk,
+                'get_oss',
+                file_name,
+                'pdf',
+                template='oss.html',
+                queue='high',
+            )
+            return JobResponse(job_id)
+        pdf = get_cached_report(
+            session.get_fingerprint('oss.html'),
+            session.get_oss,
+        )
         # return Response(
         #     pdf,
         #     template_name='oss.html',
@@ -1499,49 +1717,9 @@ class SessionViewSet(viewsets.ModelViewSet):
 
     @action(methods=['get'], detail=True, renderer_classes=[PDFRenderer], permission_classes=[AllowAny])
     def sadraft(self, request, pk=None):
-        session = Session.objects.get(pk=pk)
-        panelists = Panelist.objects.filter(
-            kind__in=[
-                Panelist.KIND.official,
-                Panelist.KIND.practice,
-            ],
-            scores__song__appearance__round__session=session,
-        ).select_related(
-            'person',
-        ).distinct(
-        ).order_by(
-            'category',
-            'person__last_name',
-        )
-        competitors = session.competitors.filter(
-            status=Competitor.STATUS.finished,
-        ).select_related(
-            'group',
-        ).prefetch_related(
-            'appearances',
-            'appearances__songs',
-            'appearances__songs__scores',
-            'appearances__songs__scores__panelist',
-            'appearances__songs__scores__panelist__person',
-        ).order_by(
-            '-tot_points',
-            '-sng_points',
-            '-per_points',
-            'group__name',
-        )
-        context = {
-            'session': session,
-            'panelists': panelists,
-            'competitors': competitors,
-        }
-        rendered = render_to_string('sa.html', context)
-        file = pydf.generate_pdf(
-            rendered,
-            page_size='Letter',
-            orientation='Landscape',
-        )
-        content = ContentFile(file)
-        pdf = content
+        session = Session.objects.select_related(
+            'convention',
+        ).get(pk=pk)
         file_name = '{0}-sa'.format(
             slugify(
                 "{0} {1} Session".format(
@@ -1550,6 +1728,21 @@ class SessionViewSet(viewsets.ModelViewSet):
                 )
             )
         )
+        if is_async(request):
+            job_id = queue_report(
+                Session,
+                session.pk,
+                'get_sa',
+                file_name,
+                'pdf',
+                template='sa.html',
+                queue='high',
+            )
+            return JobResponse(job_id)
+        pdf = get_cached_report(
+            session.get_fingerprint('sa.html'),
+            session.get_sa,
+        )
         return PDFResponse(
             pdf,
             file_name=file_name,
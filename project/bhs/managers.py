@@ -1,42 +1,113 @@
 
+# Standard Library
+import logging
+
 # Third-Party
 import django_rq
 from django_fsm_log.models import StateLog
 
 # Django
 from django.apps import apps
+from django.core.exceptions import ValidationError
+from django.db import DataError
+from django.db import IntegrityError
+from django.db import transaction
 from django.db.models import Manager
 from django.db.models import Q
 from django.utils.timezone import localdate
 
+log = logging.getLogger(__name__)
+
+# Source rows per sync job
+BATCH_SIZE = 500
+
+
+def get_pages(queryset, size=BATCH_SIZE):
+    """Yield the (first, last) keys of consecutive keyset pages."""
+    keys = queryset.order_by('pk').values_list('pk', flat=True)
+    last = None
+    while True:
+        page = keys
+        if last is not None:
+            page = page.filter(pk__gt=last)
+        page = list(page[:size])
+        if not page:
+            return
+        last = page[-1]
+        yield page[0], last
+
+
+def upsert_batch(rows, update_or_create):
+    """Apply `update_or_create` to each row in a single transaction.
+
+    Each row gets a savepoint so one bad source record is logged and
+    skipped instead of failing the whole batch.  Only data errors are
+    skipped; the batch still commits, then fails the job with the keys
+    of the skipped rows so they are not left silently unsynced.
+    """
+    t = 0
+    failures = []
+    with transaction.atomic():
+        for row in rows:
+            try:
+                with transaction.atomic():
+                    update_or_create(row)
+            except (DataError, IntegrityError, ValidationError):
+                log.exception("Sync failed for {0}".format(row.pk))
+                failures.append(str(row.pk))
+            else:
+                t += 1
+    if failures:
+        raise RuntimeError("Sync failed for {0} of {1} rows: {2}".format(
+            len(failures),
+            t + len(failures),
+            ", ".join(failures),
+        ))
+    return t
+
 
 class HumanManager(Manager):
-    def update_persons(self, cursor=None):
-        # Get base
+    def get_updated(self, cursor=None):
         humans = self.all()
-        # Filter if cursored
         if cursor:
-            humans = self.filter(
+            humans = humans.filter(
                 modified__gt=cursor,
             )
-        else:
-            # Else clear logs
+        return humans
+
+    def update_persons(self, cursor=None):
+        # Get base
+        humans = self.get_updated(cursor)
+        if not cursor:
+            # Clear logs
             ss = StateLog.objects.filter(
                 content_type__model='person',
                 groups__mc_pk__isnull=False,
             )
             ss.delete()
         t = humans.count()
-        # Creating/Update Persons
-        Person = apps.get_model('api.person')
+        # Creating/Update Persons in batches
         queue = django_rq.get_queue('low')
-        for human in humans:
+        for first, last in get_pages(humans):
             queue.enqueue(
-                Person.objects.update_or_create_from_human,
-                human,
+                self.sync_persons,
+                first,
+                last,
+                cursor,
             )
         return t
 
+    def sync_persons(self, first, last, cursor=None):
+        Person = apps.get_model('api.person')
+        humans = self.get_updated(cursor).filter(
+            pk__gte=first,
+            pk__lte=last,
+        )
+        return upsert_batch(
+            humans,
+            Person.objects.update_or_create_from_human,
+        )
+
     def delete_orphans(self):
         # Get base
         humans = self.all()
@@ -54,32 +125,47 @@ class HumanManager(Manager):
 
 
 class StructureManager(Manager):
-    def update_groups(self, cursor=None):
-        # Get base
+    def get_updated(self, cursor=None):
         structures = self.select_related('parent').all()
         if cursor:
-            # Filter if cursored
             structures = structures.filter(
                 modified__gt=cursor,
             )
-        else:
-            # Else clear logs
+        return structures
+
+    def update_groups(self, cursor=None):
+        # Get base
+        structures = self.get_updated(cursor)
+        if not cursor:
+            # Clear logs
             ss = StateLog.objects.filter(
                 content_type__model='group',
                 groups__mc_pk__isnull=False,
             )
             ss.delete()
         t = structures.count()
-        # Creating/Update Groups
-        Group = apps.get_model('api.group')
+        # Creating/Update Groups in batches
         queue = django_rq.get_queue('low')
-        for structure in structures:
+        for first, last in get_pages(structures):
             queue.enqueue(
-                Group.objects.update_or_create_from_structure,
-                structure,
+                self.sync_groups,
+                first,
+                last,
+                cursor,
             )
         return t
 
+    def sync_groups(self, first, last, cursor=None):
+        Group = apps.get_model('api.group')
+        structures = self.get_updated(cursor).filter(
+            pk__gte=first,
+            pk__lte=last,
+        )
+        return upsert_batch(
+            structures,
+            Group.objects.update_or_create_from_structure,
+        )
+
     def delete_orphans(self):
         # Get base
         structures = self.all()
@@ -97,8 +183,7 @@ class StructureManager(Manager):
 
 
 class RoleManager(Manager):
-    def update_officers(self, cursor=None):
-        # Get base
+    def get_updated(self, cursor=None):
         roles = self.select_related(
             'structure',
             'human',
@@ -106,34 +191,48 @@ class RoleManager(Manager):
             'modified',
             'created',
         )
-        # Will rebuild without a cursor
         if cursor:
             roles = roles.filter(
                 modified__gt=cursor,
             )
-        else:
-            # Else clear logs
+        return roles
+
+    def update_officers(self, cursor=None):
+        # Get base; will rebuild without a cursor
+        roles = self.get_updated(cursor)
+        if not cursor:
+            # Clear logs
             ss = StateLog.objects.filter(
                 content_type__model='officer',
                 officers__mc_pk__isnull=False,
             )
             ss.delete()
         t = roles.count()
-        # Creating/Update Officers
-        Officer = apps.get_model('api.officer')
+        # Creating/Update Officers in batches
         queue = django_rq.get_queue('low')
-        for role in roles:
+        for first, last in get_pages(roles):
             queue.enqueue(
-                Officer.objects.update_or_create_from_role,
-                role,
+                self.sync_officers,
+                first,
+                last,
+                cursor,
             )
         return t
 
+    def sync_officers(self, first, last, cursor=None):
+        Officer = apps.get_model('api.officer')
+        roles = self.get_updated(cursor).filter(
+            pk__gte=first,
+            pk__lte=last,
+        )
+        return upsert_batch(
+            roles,
+            Officer.objects.update_or_create_from_role,
+        )
+
 
 class JoinManager(Manager):
-    def update_members(self, cursor=None):
-        Member = apps.get_model('api.member')
-        # Get base
+    def get_updated(self, cursor=None):
         joins = self.select_related(
             'structure',
             'subscription',
@@ -146,38 +245,61 @@ class JoinManager(Manager):
             joins = joins.filter(
                 modified__gt=cursor,
             )
-        else:
-            # Else clear logs
+        return joins
+
+    def update_members(self, cursor=None):
+        # Get base
+        joins = self.get_updated(cursor)
+        if not cursor:
+            # Clear logs
             ss = StateLog.objects.filter(
                 content_type__model='member',
                 members__mc_pk__isnull=False,
             )
             ss.delete()
-
-        t = joins.count()
-        # Creating/Update Membership
+        # Joins for the same (structure, human) update the same Member and
+        # must apply in order; different pairs are independent.
+        pairs = {}
+        for pk, structure, human in joins.values_list(
+            'pk',
+            'structure',
+            'subscription__human',
+        ):
+            pairs.setdefault((structure, human), []).append(pk)
+        # Pack whole pairs into batches so each job owns its pairs outright
+        # and the jobs can run in parallel.
+        t = 0
+        batch = []
         queue = django_rq.get_queue('low')
-        prior = None
-        for join in joins:
-            # Member.objects.update_or_create_from_join(join)
-            if not prior:
-                prior = queue.enqueue(
-                    Member.objects.update_or_create_from_join,
-                    join,
-                )
-            else:
-                current = queue.enqueue(
-                    Member.objects.update_or_create_from_join,
-                    join,
-                    depends_on=prior,
+        for pks in pairs.values():
+            batch.extend(pks)
+            t += len(pks)
+            if len(batch) >= BATCH_SIZE:
+                queue.enqueue(
+                    self.sync_members,
+                    batch,
                 )
-                prior = current
+                batch = []
+        if batch:
+            queue.enqueue(
+                self.sync_members,
+                batch,
+            )
         return t
 
+    def sync_members(self, pks):
+        Member = apps.get_model('api.member')
+        joins = self.get_updated().filter(
+            pk__in=pks,
+        )
+        return upsert_batch(
+            joins,
+            Member.objects.update_or_create_from_join,
+        )
+
 
 class SubscriptionManager(Manager):
-    def update_users(self, cursor=None):
-        # Get base
+    def get_updated(self, cursor=None):
         subscriptions = self.select_related(
             'human',
         ).filter(
@@ -189,20 +311,37 @@ class SubscriptionManager(Manager):
             subscriptions = subscriptions.filter(
                 modified__gt=cursor,
             )
-        else:
-            # Else clear logs
+        return subscriptions
+
+    def update_users(self, cursor=None):
+        # Get base
+        subscriptions = self.get_updated(cursor)
+        if not cursor:
+            # Clear logs
             ss = StateLog.objects.filter(
                 content_type__model='user',
                 users__mc_pk__isnull=False,
             )
             ss.delete()
         t = subscriptions.count()
-        # Creating/Update Persons
-        User = apps.get_model('api.user')
+        # Creating/Update Users in batches
         queue = django_rq.get_queue('low')
-        for subscription in subscriptions:
+        for first, last in get_pages(subscriptions):
             queue.enqueue(
-                User.objects.update_or_create_from_subscription,
-                subscription,
+                self.sync_users,
+                first,
+                last,
+                cursor,
             )
         return t
+
+    def sync_users(self, first, last, cursor=None):
+        User = apps.get_model('api.user')
+        subscriptions = self.get_updated(cursor).filter(
+            pk__gte=first,
+            pk__lte=last,
+        )
+        return upsert_batch(
+            subscriptions,
+            User.objects.update_or_create_from_subscription,
+        )
@@ -0,0 +1,283 @@
+# Standard Library
+import json
+import os
+import random
+import time
+from contextlib import contextmanager
+
+# Third-Party
+import pytest
+
+# Django
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+# First-Party
+from api.factories import AssignmentFactory
+from api.factories import AwardFactory
+from api.factories import ChartFactory
+from api.factories import ContestantFactory
+from api.factories import ContestFactory
+from api.factories import ConventionFactory
+from api.factories import EntryFactory
+from api.factories import GrantorFactory
+from api.factories import GroupFactory
+from api.factories import MemberFactory
+from api.factories import OfficerFactory
+from api.factories import RepertoryFactory
+from api.factories import RoundFactory
+from api.factories import SessionFactory
+from api.factories import UserFactory
+from api.models import Appearance
+from api.models import Assignment
+from api.models import Award
+from api.models import Contestant
+from api.models import Entry
+from api.models import Group
+from api.models import Officer
+from api.models import Round
+from api.models import Score
+from api.models import Session
+from api.utils import bulk_update
+
+BUDGETS = os.path.join(os.path.dirname(__file__), 'budgets.json')
+
+# Wall time may run this many times over budget before failing; query
+# counts are exact.
+LATENCY_TOLERANCE = 2.0
+
+# Wall time under this many seconds is mostly noise and never fails
+LATENCY_FLOOR = 0.5
+
+# Size of the generated convention
+COMPETITORS = 50
+CHARTS = 120
+REPERTORY_SIZE = 6
+
+
+@pytest.fixture(scope='session')
+def budgets():
+    with open(BUDGETS) as f:
+        budgets = json.load(f)
+    yield budgets
+    if os.environ.get('UPDATE_BUDGETS'):
+        with open(BUDGETS, 'w') as f:
+            json.dump(budgets, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+
+@pytest.fixture
+def benchmark(budgets):
+    """Measure queries and wall time of a block against its budget.
+
+    Run with `UPDATE_BUDGETS=1` to record the measurements as the new
+    budgets instead.
+    """
+    @contextmanager
+    def measure(name):
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            yield
+            seconds = time.perf_counter() - start
+        queries = len(context.captured_queries)
+        if os.environ.get('UPDATE_BUDGETS'):
+            budgets[name] = {
+                'queries': queries,
+                'seconds': round(seconds, 3),
+            }
+            return
+        budget = budgets.get(name)
+        if budget is None:
+            pytest.fail("No budget for {0}; record with UPDATE_BUDGETS=1".format(name))
+        assert queries <= budget['queries'], "{0} ran {1} queries, budget {2}".format(
+            name,
+            queries,
+            budget['queries'],
+        )
+        assert seconds <= max(
+            budget['seconds'] * LATENCY_TOLERANCE,
+            LATENCY_FLOOR,
+        ), "{0} took {1:.3f}s, budget {2}s".format(
+            name,
+            seconds,
+            budget['seconds'],
+        )
+    return measure
+
+
+@pytest.fixture
+def verified_session():
+    """A verified quartet session with a full panel and approved entries."""
+    random.seed(COMPETITORS)
+    convention = ConventionFactory()
+    AssignmentFactory(
+        convention=convention,
+        category=Assignment.CATEGORY.drcj,
+    )
+    AssignmentFactory(
+        convention=convention,
+        category=Assignment.CATEGORY.ca,
+    )
+    for category in [
+        Assignment.CATEGORY.music,
+        Assignment.CATEGORY.performance,
+        Assignment.CATEGORY.singing,
+    ]:
+        for i in range(convention.panel):
+            AssignmentFactory(
+                convention=convention,
+                category=category,
+            )
+        AssignmentFactory(
+            convention=convention,
+            category=category,
+            kind=Assignment.KIND.practice,
+        )
+    GrantorFactory(
+        convention=convention,
+    )
+    session = SessionFactory(
+        convention=convention,
+        status=Session.STATUS.verified,
+    )
+    RoundFactory(
+        session=session,
+        kind=Round.KIND.semis,
+        num=1,
+    )
+    RoundFactory(
+        session=session,
+        kind=Round.KIND.finals,
+        num=2,
+    )
+    contests = [
+        ContestFactory(
+            session=session,
+            award=AwardFactory(
+                rounds=2,
+            ),
+        ),
+        ContestFactory(
+            session=session,
+            award=AwardFactory(
+                rounds=1,
+                level=Award.LEVEL.qualifier,
+                threshold=76.0,
+            ),
+        ),
+    ]
+    # Unique names and emails; Faker repeats itself at this size
+    charts = [
+        ChartFactory(
+            title='Chart {0}'.format(i),
+        ) for i in range(CHARTS)
+    ]
+    chorus = GroupFactory(
+        name='Chorus',
+        email='chorus@barberscore.com',
+        kind=Group.KIND.chorus,
+    )
+    for draw in range(1, COMPETITORS + 1):
+        group = GroupFactory(
+            name='Quartet {0}'.format(draw),
+            email='quartet{0}@barberscore.com'.format(draw),
+        )
+        for part in range(4):
+            member = MemberFactory(
+                group=group,
+            )
+            # Quartet members also sing in a chorus
+            MemberFactory(
+                group=chorus,
+                person=member.person,
+            )
+            UserFactory(
+                person=member.person,
+                email=member.person.email,
+            )
+        OfficerFactory(
+            group=group,
+            person=member.person,
+            status=Officer.STATUS.active,
+        )
+        for chart in random.sample(charts, REPERTORY_SIZE):
+            RepertoryFactory(
+                group=group,
+                chart=chart,
+            )
+        entry = EntryFactory(
+            session=session,
+            group=group,
+            status=Entry.STATUS.approved,
+            draw=draw,
+        )
+        for contest in contests:
+            ContestantFactory(
+                entry=entry,
+                contest=contest,
+                status=Contestant.STATUS.included,
+            )
+    return session
+
+
+@pytest.fixture
+def started_session(verified_session):
+    verified_session.start()
+    verified_session.save()
+    return verified_session
+
+
+@pytest.fixture
+def built_round(started_session):
+    round = started_session.rounds.get(num=1)
+    round.build()
+    round.save()
+    return round
+
+
+@pytest.fixture
+def started_round(built_round):
+    built_round.start()
+    built_round.save()
+    return built_round
+
+
+@pytest.fixture
+def scored_round(started_round):
+    """Score every song and finish every appearance.
+
+    Each competitor scores within a narrow band so that no variance
+    reports are triggered.
+    """
+    scores = list(Score.objects.filter(
+        song__appearance__round=started_round,
+    ).select_related(
+        'song__appearance',
+    ))
+    levels = {}
+    for score in scores:
+        level = levels.setdefault(
+            score.song.appearance.competitor_id,
+            random.randint(60, 85),
+        )
+        score.points = level + random.randint(-1, 1)
+    bulk_update(scores, ['points'])
+    started_round.appearances.update(
+        status=Appearance.STATUS.finished,
+    )
+    return started_round
+
+
+@pytest.fixture
+def tallied_round(scored_round):
+    for appearance in scored_round.appearances.all():
+        appearance.verify()
+        appearance.save()
+    return scored_round
+
+
+@pytest.fixture
+def verified_round(tallied_round):
+    tallied_round.verify()
+    tallied_round.save()
+    return tallied_round
@@ -0,0 +1,136 @@
+# Third-Party
+import pytest
+from rest_framework import status
+
+# Django
+from django.urls import reverse
+
+# First-Party
+from api.urls import router
+
+pytestmark = [
+    pytest.mark.django_db,
+    pytest.mark.benchmark,
+]
+
+VIEWSETS = [
+    (basename, viewset) for prefix, viewset, basename in router.registry
+    if getattr(viewset, 'queryset', None) is not None
+]
+
+LIST_REPORTS = [
+    'chart-report',
+    'group-quartets',
+    'chart-export',
+    'group-export',
+    'member-export',
+    'officer-export',
+    'person-export',
+    'score-export',
+]
+
+ROUND_REPORTS = [
+    'round-announcements',
+    'round-csadraft',
+    'round-ossdraft',
+    'round-repertoire',
+    'round-sadraft',
+    'round-sung',
+]
+
+SESSION_REPORTS = [
+    'session-contact',
+    'session-drcj',
+    'session-legacy',
+    'session-ossdraft',
+    'session-sadraft',
+]
+
+
+def fetch(client, path):
+    response = client.get(path)
+    assert response.status_code == status.HTTP_200_OK
+    # Drain streamed exports inside the measured block
+    if response.streaming:
+        b''.join(response.streaming_content)
+
+
+@pytest.mark.parametrize('basename,viewset', VIEWSETS)
+def test_endpoint_list(admin_api_client, verified_round, benchmark, basename, viewset):
+    path = reverse('{0}-list'.format(basename))
+    with benchmark('{0}-list'.format(basename)):
+        fetch(admin_api_client, path)
+
+
+@pytest.mark.parametrize('basename,viewset', VIEWSETS)
+def test_endpoint_detail(admin_api_client, verified_round, benchmark, basename, viewset):
+    instance = viewset.queryset.model.objects.first()
+    path = reverse('{0}-detail'.format(basename), args=(str(instance.pk),))
+    with benchmark('{0}-detail'.format(basename)):
+        fetch(admin_api_client, path)
+
+
+@pytest.mark.parametrize('name', LIST_REPORTS)
+def test_list_report(admin_api_client, verified_round, benchmark, name):
+    path = reverse(name)
+    with benchmark(name):
+        fetch(admin_api_client, path)
+
+
+def test_group_roster(admin_api_client, verified_round, benchmark):
+    group = verified_round.session.entries.first().group
+    path = reverse('group-roster', args=(str(group.id),))
+    with benchmark('group-roster'):
+        fetch(admin_api_client, path)
+
+
+@pytest.mark.parametrize('name', ROUND_REPORTS)
+def test_round_report(admin_api_client, verified_round, benchmark, name):
+    path = reverse(name, args=(str(verified_round.id),))
+    with benchmark(name):
+        fetch(admin_api_client, path)
+
+
+@pytest.mark.parametrize('name', SESSION_REPORTS)
+def test_session_report(admin_api_client, verified_round, benchmark, name):
+    path = reverse(name, args=(str(verified_round.session.id),))
+    with benchmark(name):
+        fetch(admin_api_client, path)
+
+
+def test_session_start(verified_session, benchmark):
+    with benchmark('session.start'):
+        verified_session.start()
+        verified_session.save()
+
+
+def test_round_build(started_session, benchmark):
+    round = started_session.rounds.get(num=1)
+    with benchmark('round.build'):
+        round.build()
+        round.save()
+
+
+def test_round_start(built_round, benchmark):
+    with benchmark('round.start'):
+        built_round.start()
+        built_round.save()
+
+
+def test_appearance_verify(scored_round, benchmark):
+    appearance = scored_round.appearances.first()
+    with benchmark('appearance.verify'):
+        appearance.verify()
+        appearance.save()
+
+
+def test_round_verify(tallied_round, benchmark):
+    with benchmark('round.verify'):
+        tallied_round.verify()
+        tallied_round.save()
+
+
+def test_round_finish(verified_round, benchmark):
+    with benchmark('round.finish'):
+        verified_round.finish()
+        verified_round.save()
@@ -1,4 +1,9 @@
 
+# Standard Library
+import csv
+import io
+import json
+
 # Third-Party
 import pytest
 from rest_framework import status
@@ -319,6 +324,42 @@ def test_round_endpoint_detail(admin_api_client, round, django_assert_num_querie
         assert response.status_code == status.HTTP_200_OK
 
 
+def test_round_endpoint_repertoire(admin_api_client, round):
+    path = reverse('round-repertoire', args=(str(round.id),))
+    response = admin_api_client.get(path)
+    assert response.status_code == status.HTTP_200_OK
+
+
+def test_person_endpoint_export(admin_api_client, person):
+    person.airports = ['LAX', 'SFO']
+    person.save()
+    path = reverse('person-export')
+    response = admin_api_client.get(path)
+    assert response.status_code == status.HTTP_200_OK
+    assert response['Content-Type'] == 'text/csv'
+    body = b''.join(response.streaming_content).decode('utf-8')
+    rows = list(csv.reader(io.StringIO(body)))
+    fields = [field.attname for field in person._meta.concrete_fields]
+    assert rows[0] == fields
+    assert len(rows) == 2
+    assert rows[1][fields.index('id')] == str(person.id)
+    assert rows[1][fields.index('last_name')] == person.last_name
+    assert json.loads(rows[1][fields.index('airports')]) == ['LAX', 'SFO']
+
+
+def test_score_endpoint_export_ndjson(admin_api_client, score):
+    path = reverse('score-export')
+    response = admin_api_client.get(path, {'format': 'ndjson'})
+    assert response.status_code == status.HTTP_200_OK
+    assert response['Content-Type'] == 'application/x-ndjson'
+    body = b''.join(response.streaming_content).decode('utf-8')
+    rows = [json.loads(line) for line in body.splitlines()]
+    assert len(rows) == 1
+    assert rows[0]['id'] == str(score.id)
+    assert rows[0]['song_id'] == str(score.song_id)
+    assert rows[0]['points'] == score.points
+
+
 def test_score_endpoint_detail(admin_api_client, score, django_assert_num_queries):
     with django_assert_num_queries(1):
         path = reverse('score-detail', args=(str(score.id),))
@@ -0,0 +1,67 @@
+# Standard Library
+from types import SimpleNamespace
+
+# First-Party
+from api.utils import assign_ranks
+from api.utils import detect_variances
+
+
+def test_assign_ranks_ties():
+    objects = [
+        SimpleNamespace(tot_points=points)
+        for points in [90, 80, 90, 70]
+    ]
+    fields = assign_ranks(objects, categories=['tot'])
+    assert fields == ['tot_rank']
+    assert [o.tot_rank for o in objects] == [1, 3, 1, 4]
+
+
+def test_assign_ranks_unscored():
+    objects = [
+        SimpleNamespace(tot_points=points)
+        for points in [None, 80, None]
+    ]
+    assign_ranks(objects, categories=['tot'])
+    assert [o.tot_rank for o in objects] == [None, 1, None]
+
+
+def test_detect_variances_asterisk():
+    scores = [
+        ('song', 30, 70),
+        ('song', 30, 82),
+        ('song', 40, 74),
+        ('song', 40, 75),
+        ('song', 50, 74),
+        ('song', 50, 75),
+    ]
+    asterisks, dixons = detect_variances(scores)['song']
+    assert asterisks == [30]
+
+
+def test_detect_variances_three_judges():
+    scores = [
+        ('song', 30, 60),
+        ('song', 40, 72),
+        ('song', 50, 73),
+    ]
+    asterisks, dixons = detect_variances(scores)['song']
+    assert asterisks == []
+    assert dixons == [30]
+
+
+def test_detect_variances_incomplete_panel():
+    scores = [
+        ('song', 30, 60),
+        ('song', 40, 72),
+        ('song', 50, None),
+    ]
+    assert detect_variances(scores) == {}
+
+
+def test_detect_variances_small_panel():
+    scores = [
+        ('song', 30, 60),
+        ('song', 40, 80),
+    ]
+    asterisks, dixons = detect_variances(scores)['song']
+    assert dixons == []